@@ -0,0 +1,157 @@
+import heapq
+import os
+import time
+from scanner import walk_depth_first
+
+DEFAULT_TOP = 20
+# Partial results are handed out at most this often while the walk runs
+SNAPSHOT_INTERVAL = 0.5
+# Extensions tracked one by one; any beyond this are summed under OTHER
+MAX_EXTENSIONS = 5000
+OTHER = "(other)"
+NO_EXTENSION = "(none)"
+DAY = 24 * 60 * 60
+# Upper bounds of the age buckets, by time since last modification
+AGE_BUCKETS = (
+    ("Last day", DAY),
+    ("Last week", 7 * DAY),
+    ("Last month", 30 * DAY),
+    ("Last 6 months", 182 * DAY),
+    ("Last year", 365 * DAY),
+    ("1-2 years", 2 * 365 * DAY),
+    ("2-5 years", 5 * 365 * DAY),
+    ("Older", float("inf"))
+)
+
+class StorageAnalyzer:
+    """
+    Disk usage breakdown of one tree, built from a single walk.
+
+    Memory does not grow with the number of files: the largest files and
+    folders are kept in min-heaps of size top, extensions in a capped
+    table, and folder totals only while some of their subfolders are
+    still being listed. A folder's total is final once all of its
+    subfolders are, at which point it is offered to the heap and added to
+    its parent. Fed in depth-first order (scanner.walk_depth_first), the
+    open folders are only the ancestors of the one being listed, so
+    memory grows with the tree's depth rather than its folder count.
+    """
+
+    def __init__(self, path, top=DEFAULT_TOP):
+        self.path = os.path.abspath(path)
+        self.top = top
+        self.size = 0
+        self.files = 0
+        self.folders = 0
+        self.largest_files = []
+        self.largest_folders = []
+        self.extensions = {}
+        self.ages = [[0, 0] for _ in AGE_BUCKETS]
+        # dirpath -> [parent, subfolders still open, subtree bytes so far];
+        # one chain of ancestors when fed depth-first
+        self._open = {}
+        self._now = time.time()
+
+    def _offer(self, heap, size, path):
+        if len(heap) < self.top:
+            heapq.heappush(heap, (size, path))
+        elif size > heap[0][0]:
+            heapq.heapreplace(heap, (size, path))
+
+    def _add_file(self, entry):
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            return 0
+        size = st.st_size
+        self.size += size
+        self.files += 1
+        self._offer(self.largest_files, size, entry.path)
+
+        ext = os.path.splitext(entry.name)[1].lower() or NO_EXTENSION
+        if ext not in self.extensions and len(self.extensions) >= MAX_EXTENSIONS:
+            ext = OTHER
+        totals = self.extensions.get(ext)
+        if totals is None:
+            totals = self.extensions[ext] = [0, 0]
+        totals[0] += size
+        totals[1] += 1
+
+        age = self._now - st.st_mtime
+        for bucket, (_, limit) in zip(self.ages, AGE_BUCKETS):
+            if age < limit:
+                bucket[0] += size
+                bucket[1] += 1
+                break
+        return size
+
+    def _close(self, dirpath):
+        """Finalizes a folder whose subfolders are all done, then its parents in turn."""
+        while dirpath is not None:
+            parent, _, size = self._open.pop(dirpath)
+            if dirpath != self.path:
+                self._offer(self.largest_folders, size, dirpath)
+            if parent is None:
+                return
+            record = self._open[parent]
+            record[1] -= 1
+            record[2] += size
+            dirpath = parent if record[1] == 0 else None
+
+    def add_listing(self, dirpath, dirs, files):
+        """Feeds one (dirpath, dirs, files) tuple from scanner.walk_depth_first (or scanner.walk)."""
+        own = 0
+        for entry in files:
+            if not entry.is_symlink():
+                own += self._add_file(entry)
+        self.folders += len(dirs)
+        parent = None if dirpath == self.path else os.path.dirname(dirpath)
+        self._open[dirpath] = [parent, len(dirs), own]
+        if not dirs:
+            self._close(dirpath)
+
+    def snapshot(self, done=False, limit=None):
+        """The results so far as a JSON-ready dict; folder totals are only listed once final."""
+        limit = self.top if limit is None else limit
+        extensions = sorted(self.extensions.items(), key=lambda item: item[1][0], reverse=True)
+        shown = extensions[:limit]
+        rest = extensions[limit:]
+        if rest:
+            shown.append((OTHER, [sum(t[0] for _, t in rest), sum(t[1] for _, t in rest)]))
+        return {
+            "done": done,
+            "path": self.path,
+            "size": self.size,
+            "files": self.files,
+            "folders": self.folders,
+            "largest_files": [{"path": path, "size": size} for size, path in sorted(self.largest_files, reverse=True)],
+            "largest_folders": [{"path": path, "size": size}
+                                for size, path in sorted(self.largest_folders, reverse=True)],
+            "extensions": [{"extension": ext, "size": size, "files": files} for ext, (size, files) in shown],
+            "ages": [{"label": label, "size": size, "files": files}
+                     for (label, _), (size, files) in zip(AGE_BUCKETS, self.ages)]
+        }
+
+def analyze(path, top=DEFAULT_TOP, progress=None, interval=SNAPSHOT_INTERVAL):
+    """
+    Walks path once and yields StorageAnalyzer snapshots: partial ones at
+    most every interval seconds while the walk runs, then a final one
+    with done set. Stops early, without a final snapshot, if progress is
+    cancelled.
+    """
+    analyzer = StorageAnalyzer(path, top)
+    next_snapshot = time.monotonic() + interval
+    walker = walk_depth_first(analyzer.path)
+    try:
+        for dirpath, dirs, files in walker:
+            analyzer.add_listing(dirpath, dirs, files)
+            if progress is not None:
+                if progress.cancelled():
+                    return
+                progress.advance(files=len(files))
+            if time.monotonic() >= next_snapshot:
+                yield analyzer.snapshot()
+                next_snapshot = time.monotonic() + interval
+    finally:
+        walker.close()
+    yield analyzer.snapshot(done=True)
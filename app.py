@@ -1,13 +1,43 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
+import json
 import os
+import threading
+import time
 
 # Import our backend features
+from analyzer import DEFAULT_TOP, analyze
+from config import HASH_ALGORITHM
 from organizer import organize_files
+from pipeline import STEPS, run_pipeline
 from features import remove_duplicates, remove_empty_folders, undo_last_organization
-from logger import get_recent_logs, log_action
+from logger import get_last_seq, get_logs_since, get_recent_logs, log_action, wait_for_logs
+from hasher import ALGORITHMS
+from indexer import build_index, iter_search
+from jobs import get_job, list_jobs, submit_job
+from locks import path_locks
+from rules import get_ruleset, reload_rules
+from metrics import CONTENT_TYPE, REQUEST_LATENCY, render as render_metrics, track_operation
+from journal import find_undo_target, list_operations
+from query import parse_query
+from storage_cache import get_directory_totals
+from watcher import list_watches, start_watch, stop_watch
 
 app = Flask(__name__)
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # The route pattern, not the raw URL, so job IDs do not create new series
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint,
+                                method=request.method, status=response.status_code)
+    return response
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -20,52 +50,113 @@ def cleanup():
 def search_page():
     return render_template("search.html")
 
+def format_size(size_bytes):
+    """Formats a byte count the way the search table displays it."""
+    if size_bytes is None:
+        return "Unknown"
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+SEARCH_PAGE_SIZE = 1000
+MAX_SEARCH_PAGE_SIZE = 10000
+MAX_ANALYZE_TOP = 500
+
 @app.route("/api/search", methods=["POST"])
 def api_search():
     data = request.json
     base_path = data.get("path")
-    query = data.get("query", "").lower()
+    query_text = data.get("query", "").strip()
+    cursor = data.get("cursor")
+    stream = bool(data.get("stream", False))
     
-    if not base_path or not os.path.exists(base_path) or not query:
+    if not base_path or not os.path.exists(base_path) or not query_text:
         return jsonify({"success": False, "message": "Invalid path or empty query."}), 400
-        
-    results = []
+
     try:
-        # Search recursively
-        for root, _, files in os.walk(base_path):
-            for file in files:
-                if query in file.lower():
-                    full_path = os.path.join(root, file)
-                    # Get size safely
-                    try:
-                        size_bytes = os.path.getsize(full_path)
-                        if size_bytes < 1024:
-                            size_str = f"{size_bytes} B"
-                        elif size_bytes < 1024 * 1024:
-                            size_str = f"{size_bytes / 1024:.1f} KB"
-                        elif size_bytes < 1024 * 1024 * 1024:
-                            size_str = f"{size_bytes / (1024 * 1024):.1f} MB"
-                        else:
-                            size_str = f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
-                    except:
-                        size_str = "Unknown"
-                        
-                    results.append({
-                        "name": file,
-                        "path": full_path,
-                        "size": size_str
-                    })
-                    
-                    # Hard limit returns to prevent overwhelming the browser
-                    if len(results) > 1000:
-                        break
-            if len(results) > 1000:
-                break
-                
-        return jsonify({"success": True, "results": results})
+        query = parse_query(query_text)
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid query: {e}"}), 400
+
+    try:
+        limit = min(int(data.get("limit", SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid page size."}), 400
+
+    def pages():
+        """Yields result dicts for one page and finally the next cursor (or None)."""
+        count = 0
+        last_cursor = None
+        matches = iter_search(base_path, query, cursor)
+        with path_locks.hold([base_path]):
+            try:
+                for name, full_path, size_bytes, match_cursor in matches:
+                    if count == limit:
+                        # There is at least one more match, so hand out a cursor
+                        yield last_cursor
+                        return
+                    yield {"name": name, "path": full_path, "size": format_size(size_bytes)}
+                    count += 1
+                    last_cursor = match_cursor
+            finally:
+                matches.close()
+        yield None
+
+    if stream:
+        # NDJSON: one result per line as soon as it is found, then a summary line
+        def generate():
+            count = 0
+            try:
+                for item in pages():
+                    if isinstance(item, dict):
+                        count += 1
+                        yield json.dumps(item) + "\n"
+                    else:
+                        yield json.dumps({"done": True, "count": count, "next_cursor": item}) + "\n"
+            except Exception as e:
+                yield json.dumps({"done": True, "count": count, "next_cursor": None, "error": str(e)}) + "\n"
+
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    try:
+        results = []
+        next_cursor = None
+        for item in pages():
+            if isinstance(item, dict):
+                results.append(item)
+            else:
+                next_cursor = item
+        return jsonify({"success": True, "results": results, "next_cursor": next_cursor})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route("/api/index", methods=["POST"])
+def api_build_index():
+    data = request.json
+    path = data.get("path")
+    
+    if not path or not os.path.isdir(path):
+        return jsonify({"success": False, "message": "Invalid directory path"}), 400
+        
+    log_action("\n--- Building Search Index ---")
+    with path_locks.hold([path]):
+        file_count = build_index(path)
+    
+    if file_count is not None:
+        return jsonify({"success": True, "message": f"Indexed {file_count} files.", "files": file_count})
+    else:
+        return jsonify({"success": False, "message": "Failed to build search index."}), 500
+
+def start_job(name, func, *args, messages, **kwargs):
+    """Submits a long operation to the job engine and answers with its ID straight away."""
+    job = submit_job(name, func, *args, messages=messages, **kwargs)
+    return jsonify({"success": True, "job_id": job.id, "message": f"{name} started."}), 202
+
 @app.route("/api/organize", methods=["POST"])
 def api_organize():
     data = request.json
@@ -75,29 +166,50 @@ def api_organize():
     if not path or not os.path.exists(path):
         return jsonify({"success": False, "message": "Invalid directory path"}), 400
         
+    if data.get("dry_run"):
+        log_action(f"\n--- Previewing Organization (Method: {method}) ---")
+        with path_locks.hold([path]):
+            plan = organize_files(path, method, dry_run=True)
+        if plan is None:
+            return jsonify({"success": False, "message": "Failed to plan organization."}), 500
+        return jsonify({
+            "success": True,
+            "message": f"{plan['total']} files would be moved into {len(plan['folders'])} folders.",
+            "plan": plan
+        })
+
     log_action(f"\n--- Starting Organization (Method: {method}) ---")
-    success = organize_files(path, method)
-    
-    if success:
-        return jsonify({"success": True, "message": "Files organized successfully!"})
-    else:
-        return jsonify({"success": False, "message": "Failed to organize files."}), 500
+    return start_job("Organization", organize_files, path, method, lock_paths=[path],
+                     messages=("Files organized successfully!", "Failed to organize files."))
 
 @app.route("/api/clean/duplicates", methods=["POST"])
 def api_remove_duplicates():
     data = request.json
-    path = data.get("path")
+    # Several roots may be compared against each other
+    paths = data.get("paths") or [data.get("path")]
+    hardlink = bool(data.get("hardlink"))
+    algorithm = data.get("algorithm") or HASH_ALGORITHM
     
-    if not path or not os.path.exists(path):
+    if not all(path and os.path.exists(path) for path in paths):
         return jsonify({"success": False, "message": "Invalid directory path"}), 400
+    if algorithm not in ALGORITHMS:
+        return jsonify({"success": False, "message": f"Unknown hash algorithm: {algorithm}"}), 400
         
+    if data.get("dry_run"):
+        log_action("\n--- Previewing Duplicates ---")
+        return start_job("Duplicate preview", remove_duplicates, paths, dry_run=True, algorithm=algorithm,
+                         lock_paths=paths, shared=True, messages=(
+            lambda report: f"Found {report['duplicate_files']} duplicates, {format_size(report['reclaimable_bytes'])} reclaimable.",
+            "Failed to scan for duplicates."))
+
+    if hardlink:
+        log_action("\n--- Replacing Duplicates With Hard Links ---")
+        return start_job("Duplicate linking", remove_duplicates, paths, hardlink=True, algorithm=algorithm, lock_paths=paths,
+                         messages=("Duplicates replaced with hard links.", "Failed to link duplicates."))
+
     log_action("\n--- Removing Duplicates ---")
-    success = remove_duplicates(path)
-    
-    if success:
-        return jsonify({"success": True, "message": "Duplicates checked and removed."})
-    else:
-        return jsonify({"success": False, "message": "Failed to remove duplicates."}), 500
+    return start_job("Duplicate removal", remove_duplicates, paths, algorithm=algorithm, lock_paths=paths,
+                     messages=("Duplicates checked and removed.", "Failed to remove duplicates."))
 
 @app.route("/api/clean/empty_folders", methods=["POST"])
 def api_remove_empty_folders():
@@ -107,23 +219,123 @@ def api_remove_empty_folders():
     if not path or not os.path.exists(path):
         return jsonify({"success": False, "message": "Invalid directory path"}), 400
         
+    if data.get("dry_run"):
+        log_action("\n--- Previewing Empty Folders ---")
+        return start_job("Empty folder preview", remove_empty_folders, path, dry_run=True,
+                         lock_paths=[path], shared=True, messages=(
+            lambda report: f"Found {report['total']} empty folders.",
+            "Failed to scan for empty folders."))
+
     log_action("\n--- Cleaning Empty Folders ---")
-    success = remove_empty_folders(path)
-    
-    if success:
-        return jsonify({"success": True, "message": "Empty folders cleaned."})
-    else:
-        return jsonify({"success": False, "message": "Failed to clean empty folders."}), 500
+    return start_job("Empty folder cleanup", remove_empty_folders, path, lock_paths=[path],
+                     messages=("Empty folders cleaned.", "Failed to clean empty folders."))
+
+@app.route("/api/pipeline", methods=["POST"])
+def api_pipeline():
+    data = request.json
+    path = data.get("path")
+    steps = data.get("steps") or list(STEPS)
+    method = data.get("method", "type")
+    algorithm = data.get("algorithm") or HASH_ALGORITHM
+
+    if not path or not os.path.exists(path):
+        return jsonify({"success": False, "message": "Invalid directory path"}), 400
+    if not isinstance(steps, list) or any(step not in STEPS for step in steps) or len(set(steps)) != len(steps):
+        return jsonify({"success": False, "message": f"Steps must be distinct names from: {', '.join(STEPS)}"}), 400
+    if algorithm not in ALGORITHMS:
+        return jsonify({"success": False, "message": f"Unknown hash algorithm: {algorithm}"}), 400
+
+    dry_run = bool(data.get("dry_run"))
+    log_action(f"\n--- {'Previewing' if dry_run else 'Running'} Pipeline ({', '.join(steps)}) ---")
+    return start_job("Pipeline preview" if dry_run else "Pipeline", run_pipeline, path, steps, method,
+                     dry_run=dry_run, hardlink=bool(data.get("hardlink")), algorithm=algorithm,
+                     lock_paths=[path], shared=dry_run,
+                     messages=(lambda result: f"Ran {len(result['steps'])} of {len(steps)} steps in one pass.",
+                               "Pipeline failed."))
+
+# Operations that undo jobs still in flight are about to revert, so pressing
+# Undo again meanwhile steps back to the generation before instead
+_undo_jobs = {}
+_undo_lock = threading.Lock()
 
 @app.route("/api/undo", methods=["POST"])
 def api_undo():
-    log_action("\n--- Executing Undo ---")
-    success = undo_last_organization()
-    
-    if success:
-        return jsonify({"success": True, "message": "Undo operation completed."})
-    else:
-        return jsonify({"success": False, "message": "Undo operation failed or nothing to undo."}), 500
+    data = request.get_json(silent=True) or {}
+    with _undo_lock:
+        for op, job in list(_undo_jobs.items()):
+            if job.finished_at is not None:
+                del _undo_jobs[op]
+        target = find_undo_target(data.get("operation"), exclude=_undo_jobs)
+        if target is None:
+            return jsonify({"success": False, "message": "Nothing to undo."}), 404
+        operation_id, root = target
+
+        log_action("\n--- Executing Undo ---")
+        # Only the folder the operation organized is locked; legacy entries have no root
+        job = submit_job("Undo", undo_last_organization, operation_id=operation_id,
+                         lock_paths=[root or os.sep],
+                         messages=("Undo operation completed.", "Undo operation failed or nothing to undo."))
+        _undo_jobs[operation_id] = job
+    return jsonify({"success": True, "job_id": job.id, "message": "Undo started."}), 202
+
+@app.route("/api/watch", methods=["GET"])
+def api_watches():
+    return jsonify({"success": True, "watches": list_watches()})
+
+@app.route("/api/watch", methods=["POST"])
+def api_start_watch():
+    data = request.json
+    path = data.get("path")
+    method = data.get("method", "type")
+
+    if not path or not os.path.isdir(path):
+        return jsonify({"success": False, "message": "Invalid directory path"}), 400
+    if get_ruleset(method) is None:
+        return jsonify({"success": False, "message": f"Unknown organization method: {method}"}), 400
+
+    watcher = start_watch(path, method, organize_existing=not data.get("new_only"))
+    return jsonify({"success": True, "message": f"Watching {watcher.path} for new files.", "watch": watcher.to_dict()})
+
+@app.route("/api/watch/stop", methods=["POST"])
+def api_stop_watch():
+    data = request.json
+    path = data.get("path")
+
+    if not path or not stop_watch(path):
+        return jsonify({"success": False, "message": "This folder is not being watched."}), 404
+    return jsonify({"success": True, "message": "Stopped watching folder."})
+
+@app.route("/api/history", methods=["GET"])
+def api_history():
+    return jsonify({"success": True, "operations": list_operations()})
+
+@app.route("/api/locks", methods=["GET"])
+def api_locks():
+    return jsonify({"success": True, **path_locks.snapshot()})
+
+@app.route("/api/jobs", methods=["GET"])
+def api_jobs():
+    jobs = sorted(list_jobs(), key=lambda job: job.created_at, reverse=True)
+    return jsonify({"success": True, "jobs": [job.to_dict() for job in jobs]})
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job."}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def api_job_cancel(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job."}), 404
+    job.cancel()
+    return jsonify({"success": True, "message": "Cancellation requested.", "job": job.to_dict()})
+
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
 
 @app.route("/api/browse", methods=["GET"])
 def api_browse():
@@ -165,13 +377,8 @@ def api_storage():
             total_size = os.path.getsize(path)
             file_count = 1
         else:
-            for dirpath, dirnames, filenames in os.walk(path):
-                folder_count += len(dirnames)
-                for f in filenames:
-                    fp = os.path.join(dirpath, f)
-                    if not os.path.islink(fp):
-                        total_size += os.path.getsize(fp)
-                        file_count += 1
+            with path_locks.hold([path]):
+                total_size, file_count, folder_count = get_directory_totals(path)
                         
         # Format size
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -189,6 +396,30 @@ def api_storage():
     except Exception as e:
         return jsonify({"success": False, "size": "Error reading space", "files": 0, "folders": 0})
 
+@app.route("/api/storage/analyze", methods=["POST"])
+def api_analyze_storage():
+    data = request.json
+    path = data.get("path")
+
+    if not path or not os.path.isdir(path):
+        return jsonify({"success": False, "message": "Invalid directory path"}), 400
+    try:
+        top = min(max(int(data.get("top", DEFAULT_TOP)), 1), MAX_ANALYZE_TOP)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid top count."}), 400
+
+    # NDJSON: a partial snapshot every so often while the walk runs, then the final one
+    def generate():
+        try:
+            with path_locks.hold([path]), track_operation("analyze_storage") as run:
+                for snapshot in analyze(path, top):
+                    run.files = snapshot["files"]
+                    yield json.dumps(snapshot) + "\n"
+        except Exception as e:
+            yield json.dumps({"done": True, "error": str(e)}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
 @app.route("/api/system_storage", methods=["GET"])
 def api_system_storage():
     import shutil
@@ -222,7 +453,40 @@ def api_system_storage():
 
 @app.route("/api/logs", methods=["GET"])
 def api_logs():
-    return jsonify({"logs": get_recent_logs()})
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify({"logs": get_recent_logs(), "last_seq": get_last_seq()})
+
+    # Incremental mode: only records the client has not seen yet
+    records = get_logs_since(since)
+    return jsonify({
+        "records": [{"seq": seq, "message": msg} for seq, msg in records],
+        "last_seq": records[-1][0] if records else max(since, get_last_seq()),
+        "truncated": bool(records) and records[0][0] > since + 1
+    })
+
+@app.route("/api/logs/stream", methods=["GET"])
+def api_logs_stream():
+    # Server-sent events; browsers resend the last id on reconnect so nothing is missed
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", 0, type=int)
+
+    def generate():
+        last = since
+        while True:
+            records = wait_for_logs(last, timeout=15)
+            if not records:
+                yield ": keepalive\n\n"
+                continue
+            for seq, msg in records:
+                yield f"id: {seq}\ndata: {json.dumps(msg)}\n\n"
+            last = records[-1][0]
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 if __name__ == "__main__":
+    # Compile the organize rules up front so a broken rules file is reported at startup
+    reload_rules()
     app.run(debug=True, port=5001, threaded=True)
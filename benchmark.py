@@ -0,0 +1,327 @@
+"""
+Benchmark suite for the file operations and the search/storage API.
+
+Every run builds synthetic directory trees from a seed, so two runs with
+the same options (on the same machine) time exactly the same work, and
+writes the timings as JSON. Pass --compare with an earlier result file to
+see how each benchmark moved between commits:
+
+    python3 benchmark.py --files 20000 --output before.json
+    python3 benchmark.py --files 20000 --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_EXTENSIONS = [".jpg", ".png", ".pdf", ".docx", ".txt", ".mp4", ".mp3", ".zip", ".csv", ".py"]
+
+class TreeSpec:
+    """
+    Shape of a synthetic tree.
+
+    files are spread evenly over every directory of a tree depth levels
+    deep with fanout subdirectories each (depth 0 is a single flat
+    folder). duplicate_ratio of the files are byte copies of an earlier
+    file, sizes are log-uniform between min_size and max_size, and
+    empty_dirs chains of empty folders (up to depth deep) are added.
+    """
+
+    def __init__(self, files=5000, depth=3, fanout=4, duplicate_ratio=0.1,
+                 min_size=64, max_size=256 * 1024, extensions=None, empty_dirs=200, seed=1):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.duplicate_ratio = duplicate_ratio
+        self.min_size = min_size
+        self.max_size = max_size
+        self.extensions = extensions or DEFAULT_EXTENSIONS
+        self.empty_dirs = empty_dirs
+        self.seed = seed
+
+    def flat(self):
+        """The same files in a single folder, the shape organize_files works on."""
+        spec = TreeSpec(**self.to_dict())
+        spec.depth = 0
+        spec.empty_dirs = 0
+        return spec
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+def generate_tree(root, spec):
+    """Creates the tree described by spec under root and returns a summary of it."""
+    rng = random.Random(spec.seed)
+    os.makedirs(root, exist_ok=True)
+
+    dirs = [root]
+    level = [root]
+    for depth in range(spec.depth):
+        next_level = []
+        for parent in level:
+            for i in range(spec.fanout):
+                child = os.path.join(parent, f"dir{depth}_{i}")
+                os.mkdir(child)
+                next_level.append(child)
+        dirs.extend(next_level)
+        level = next_level
+
+    originals = []
+    total_bytes = 0
+    duplicates = 0
+    log_min, log_max = math.log(spec.min_size), math.log(spec.max_size)
+    for i in range(spec.files):
+        name = f"file{i:07d}{rng.choice(spec.extensions)}"
+        filepath = os.path.join(dirs[i % len(dirs)], name)
+        if originals and rng.random() < spec.duplicate_ratio:
+            shutil.copyfile(rng.choice(originals), filepath)
+            duplicates += 1
+        else:
+            size = int(math.exp(rng.uniform(log_min, log_max)))
+            with open(filepath, "wb") as f:
+                f.write(rng.getrandbits(8 * size).to_bytes(size, "little"))
+            originals.append(filepath)
+        total_bytes += os.path.getsize(filepath)
+
+    for i in range(spec.empty_dirs):
+        chain = [f"empty{i}_{level}" for level in range(rng.randint(1, max(1, spec.depth)))]
+        os.makedirs(os.path.join(rng.choice(dirs), *chain))
+
+    return {"files": spec.files, "duplicates": duplicates, "bytes": total_bytes,
+            "dirs": len(dirs), "empty_chains": spec.empty_dirs}
+
+def _summarize(runs):
+    return {
+        "runs": [round(run, 6) for run in runs],
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "max": round(max(runs), 6)
+    }
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+class Runner:
+    """Times each benchmark on freshly generated trees inside a scratch directory."""
+
+    def __init__(self, spec, repeat, workdir):
+        self.spec = spec
+        self.repeat = repeat
+        self.workdir = workdir
+        self.results = {}
+        self._trees = 0
+
+    def fresh_tree(self, spec=None):
+        root = os.path.join(self.workdir, f"tree{self._trees}")
+        self._trees += 1
+        generate_tree(root, spec or self.spec)
+        return root
+
+    def record(self, name, runs):
+        self.results[name] = _summarize(runs)
+        print(f"{name:<28} median {self.results[name]['median']:.4f}s", file=sys.__stdout__)
+
+    def bench_organize_and_undo(self):
+        from features import undo_last_organization
+        from organizer import organize_files
+
+        organize_runs, undo_runs = [], []
+        for _ in range(self.repeat):
+            root = self.fresh_tree(self.spec.flat())
+            elapsed, _ = _timed(organize_files, root, "type")
+            organize_runs.append(elapsed)
+            elapsed, _ = _timed(undo_last_organization)
+            undo_runs.append(elapsed)
+            shutil.rmtree(root)
+        self.record("organize_files", organize_runs)
+        self.record("undo_last_organization", undo_runs)
+
+    def bench_remove_duplicates(self):
+        from features import remove_duplicates
+
+        cold, warm = [], []
+        for _ in range(self.repeat):
+            root = self.fresh_tree()
+            # The dry run fills the hash cache, so the real run shows a warm scan
+            elapsed, _ = _timed(remove_duplicates, root, dry_run=True)
+            cold.append(elapsed)
+            elapsed, _ = _timed(remove_duplicates, root)
+            warm.append(elapsed)
+            shutil.rmtree(root)
+        self.record("remove_duplicates_cold", cold)
+        self.record("remove_duplicates_warm", warm)
+
+    def bench_remove_empty_folders(self):
+        from features import remove_empty_folders
+
+        runs = []
+        for _ in range(self.repeat):
+            root = self.fresh_tree()
+            elapsed, _ = _timed(remove_empty_folders, root)
+            runs.append(elapsed)
+            shutil.rmtree(root)
+        self.record("remove_empty_folders", runs)
+
+    def bench_pipeline(self):
+        from features import remove_duplicates, remove_empty_folders
+        from organizer import organize_files
+        from pipeline import STEPS, run_pipeline
+
+        def separately(root):
+            organize_files(root, "type")
+            remove_duplicates(root)
+            remove_empty_folders(root)
+
+        fused, separate = [], []
+        for _ in range(self.repeat):
+            root = self.fresh_tree()
+            separate.append(_timed(separately, root)[0])
+            shutil.rmtree(root)
+            root = self.fresh_tree()
+            fused.append(_timed(run_pipeline, root, STEPS)[0])
+            shutil.rmtree(root)
+        self.record("pipeline_separate", separate)
+        self.record("pipeline_fused", fused)
+
+    def bench_api(self):
+        try:
+            from app import app
+        except ImportError as e:
+            print(f"Skipping API benchmarks: {e}", file=sys.__stdout__)
+            return
+        from indexer import build_index
+
+        client = app.test_client()
+        root = self.fresh_tree()
+
+        def post(url, payload):
+            response = client.post(url, json=payload)
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} answered {response.status_code}")
+
+        search = {"path": root, "query": "file00"}
+        walk_runs = [_timed(post, "/api/search", search)[0] for _ in range(self.repeat)]
+        self.record("api_search_walk", walk_runs)
+
+        build_index(root)
+        index_runs = [_timed(post, "/api/search", search)[0] for _ in range(self.repeat)]
+        self.record("api_search_index", index_runs)
+
+        # The first query builds the size cache, later ones only revalidate it
+        storage_runs = [_timed(post, "/api/storage", {"path": root})[0] for _ in range(self.repeat + 1)]
+        self.record("api_storage_cold", storage_runs[:1])
+        self.record("api_storage_warm", storage_runs[1:])
+        shutil.rmtree(root)
+
+BENCHMARKS = {
+    "organize": Runner.bench_organize_and_undo,
+    "duplicates": Runner.bench_remove_duplicates,
+    "empty_folders": Runner.bench_remove_empty_folders,
+    "pipeline": Runner.bench_pipeline,
+    "api": Runner.bench_api
+}
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(spec, repeat=3, only=None, verbose=False):
+    """
+    Runs the selected benchmarks and returns the result document.
+
+    The working directory is switched to a scratch folder for the duration,
+    so the undo journal, hash cache, search index and log file the modules
+    keep in the current directory start empty and are thrown away afterwards.
+    """
+    from logger import flush_logs
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="organizer-bench-")
+    runner = Runner(spec, repeat, os.path.join(workdir, "trees"))
+    try:
+        os.chdir(workdir)
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                # The log writer echoes every record to stdout, which would dominate the timings
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            for name in only or BENCHMARKS:
+                BENCHMARKS[name](runner)
+            flush_logs()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": _git_commit(),
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "tree": spec.to_dict(),
+        "results": runner.results
+    }
+
+def compare(current, baseline):
+    """Prints each benchmark's median next to the baseline's, with the ratio."""
+    print(f"\n{'benchmark':<28}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>12}{result['median']:>12.4f}{'-':>8}")
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else float("inf")
+        print(f"{name:<28}{before['median']:>12.4f}{result['median']:>12.4f}{ratio:>8.2f}")
+    if baseline.get("tree") != current["tree"]:
+        print("⚠️ The baseline was generated with different tree options.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark File Organizer Pro on synthetic trees.")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1)
+    parser.add_argument("--min-size", type=int, default=64)
+    parser.add_argument("--max-size", type=int, default=256 * 1024)
+    parser.add_argument("--extensions", help="comma separated, e.g. .jpg,.pdf,.txt")
+    parser.add_argument("--empty-dirs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS),
+                        help="run only this benchmark (may be given more than once)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the operations' log output")
+    args = parser.parse_args(argv)
+
+    spec = TreeSpec(files=args.files, depth=args.depth, fanout=args.fanout,
+                    duplicate_ratio=args.duplicate_ratio, min_size=args.min_size, max_size=args.max_size,
+                    extensions=args.extensions.split(",") if args.extensions else None,
+                    empty_dirs=args.empty_dirs, seed=args.seed)
+    results = run_benchmarks(spec, repeat=args.repeat, only=args.only, verbose=args.verbose)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
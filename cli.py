@@ -0,0 +1,316 @@
+"""
+Headless command line interface, for scripts and cron jobs.
+
+    python3 cli.py organize ~/Downloads ~/Desktop --method date
+    python3 cli.py dedupe /mnt/photos /mnt/backup --dry-run --json
+    python3 cli.py clean-empty ~/Projects
+    python3 cli.py pipeline ~/Downloads --steps organize,duplicates,empty_folders
+    python3 cli.py search "ext:pdf size:>1MB" ~/Documents
+    python3 cli.py storage ~/Downloads ~/Music
+    python3 cli.py analyze ~/Downloads --top 10
+    python3 cli.py undo [--operation ID | --list]
+
+Commands taking several roots run them in parallel (--jobs). Results go
+to stdout, as text or with --json as one JSON document; log lines go to
+stderr and the log file. The exit status is 0 when every root succeeded,
+1 when any failed and 2 for usage errors.
+
+Feature modules are only imported by the command that needs them, and
+Flask and tkinter never are, so starting up costs little more than the
+interpreter itself.
+"""
+import argparse
+import json
+import os
+import sys
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+class UsageError(Exception):
+    """Bad arguments found after parsing; reported like argparse errors (exit status 2)."""
+
+def _format_size(size_bytes):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size_bytes < 1024 or unit == "TB":
+            break
+        size_bytes /= 1024
+    return f"{size_bytes:.1f} {unit}" if unit != "B" else f"{size_bytes} B"
+
+def _run_roots(func, roots, jobs, exclusive=False):
+    """
+    Calls func(root) for every root, up to jobs at a time, and returns one
+    result dict per root in the order given. func returns a dict of
+    details, or raises to mark the root as failed. Each call holds a path
+    lock on its root, so overlapping roots given together take turns.
+    """
+    from locks import path_locks
+
+    def run(root):
+        if not os.path.exists(root):
+            return {"root": root, "ok": False, "error": "path does not exist"}
+        try:
+            with path_locks.hold([root], exclusive):
+                return {"root": root, "ok": True, **func(root)}
+        except Exception as e:
+            return {"root": root, "ok": False, "error": str(e)}
+
+    if jobs <= 1 or len(roots) <= 1:
+        return [run(root) for root in roots]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(run, roots))
+
+def _check(outcome, failure):
+    """The feature functions return None/False on failure and log why."""
+    if outcome is None or outcome is False:
+        raise RuntimeError(failure)
+    return outcome if isinstance(outcome, dict) else {}
+
+def cmd_organize(args):
+    from rules import get_ruleset
+    if get_ruleset(args.method) is None:
+        raise UsageError(f"unknown organization method: {args.method}")
+    from organizer import organize_files
+
+    def organize(root):
+        return _check(organize_files(root, args.method, dry_run=args.dry_run), "failed to organize files")
+    return _run_roots(organize, args.roots, args.jobs, exclusive=not args.dry_run)
+
+def cmd_dedupe(args):
+    from hasher import ALGORITHMS
+    if args.algorithm is not None and args.algorithm not in ALGORITHMS:
+        raise UsageError(f"unknown hash algorithm: {args.algorithm}")
+    from config import HASH_ALGORITHM
+    from features import remove_duplicates
+    algorithm = args.algorithm or HASH_ALGORITHM
+
+    def dedupe(roots):
+        outcome = remove_duplicates(roots, dry_run=args.dry_run, hardlink=args.hardlink, algorithm=algorithm)
+        return _check(outcome, "failed to scan for duplicates")
+
+    if args.separately:
+        return _run_roots(lambda root: dedupe([root]), args.roots, args.jobs, exclusive=not args.dry_run)
+    # The roots are compared against each other, so they form one scan
+    missing = [root for root in args.roots if not os.path.exists(root)]
+    if missing:
+        return [{"root": root, "ok": False, "error": "path does not exist"} for root in missing]
+    try:
+        return [{"root": ", ".join(args.roots), "ok": True, **dedupe(args.roots)}]
+    except Exception as e:
+        return [{"root": ", ".join(args.roots), "ok": False, "error": str(e)}]
+
+def cmd_clean_empty(args):
+    from features import remove_empty_folders
+
+    def clean(root):
+        return _check(remove_empty_folders(root, dry_run=args.dry_run), "failed to remove empty folders")
+    return _run_roots(clean, args.roots, args.jobs, exclusive=not args.dry_run)
+
+def cmd_pipeline(args):
+    from hasher import ALGORITHMS
+    from pipeline import STEPS, run_pipeline
+    from rules import get_ruleset
+    steps = [step.strip() for step in args.steps.split(",") if step.strip()]
+    if not steps or any(step not in STEPS for step in steps) or len(set(steps)) != len(steps):
+        raise UsageError(f"steps must be distinct names from: {','.join(STEPS)}")
+    if "organize" in steps and get_ruleset(args.method) is None:
+        raise UsageError(f"unknown organization method: {args.method}")
+    if args.algorithm is not None and args.algorithm not in ALGORITHMS:
+        raise UsageError(f"unknown hash algorithm: {args.algorithm}")
+    from config import HASH_ALGORITHM
+    algorithm = args.algorithm or HASH_ALGORITHM
+
+    def pipeline(root):
+        outcome = run_pipeline(root, steps, args.method, dry_run=args.dry_run, hardlink=args.hardlink,
+                               algorithm=algorithm)
+        outcome = _check(outcome, "pipeline failed")
+        if outcome["cancelled"]:
+            raise RuntimeError("pipeline cancelled")
+        return outcome
+    return _run_roots(pipeline, args.roots, args.jobs, exclusive=not args.dry_run)
+
+def cmd_search(args):
+    from indexer import iter_search
+    from query import parse_query
+    try:
+        query = parse_query(args.query)
+    except ValueError as e:
+        raise UsageError(f"invalid query: {e}")
+
+    def search(root):
+        matches = []
+        for name, path, size_bytes, _ in iter_search(root, query):
+            if args.limit is not None and len(matches) >= args.limit:
+                break
+            matches.append({"name": name, "path": path, "size": size_bytes})
+        return {"matches": matches}
+    return _run_roots(search, args.roots, args.jobs)
+
+def cmd_storage(args):
+    from storage_cache import get_directory_totals
+
+    def storage(root):
+        if os.path.isfile(root):
+            return {"size": os.path.getsize(root), "files": 1, "folders": 0}
+        size, files, folders = get_directory_totals(root)
+        return {"size": size, "files": files, "folders": folders}
+    return _run_roots(storage, args.roots, args.jobs)
+
+def cmd_analyze(args):
+    from analyzer import analyze
+
+    def run(root):
+        *_, snapshot = analyze(root, args.top)
+        del snapshot["done"], snapshot["path"]
+        return snapshot
+    return _run_roots(run, args.roots, args.jobs)
+
+def cmd_undo(args):
+    from journal import list_operations
+    if args.list:
+        return [{"root": op["root"], "ok": True, **op} for op in list_operations()]
+    from features import undo_last_organization
+    ok = undo_last_organization(operation_id=args.operation)
+    result = {"root": None, "ok": ok, "operation": args.operation}
+    if not ok:
+        result["error"] = "nothing to undo"
+    return [result]
+
+def _describe(command, result):
+    """One line (or a few) of text for a result dict."""
+    root = result["root"]
+    if not result["ok"]:
+        return f"{root}: error: {result['error']}" if root else f"error: {result['error']}"
+    if command == "storage":
+        return f"{root}: {_format_size(result['size'])}, {result['files']} files, {result['folders']} folders"
+    if command == "analyze":
+        lines = [f"{root}: {_format_size(result['size'])}, {result['files']} files, {result['folders']} folders"]
+        for title, key, label in (("Largest folders", "largest_folders", "path"),
+                                  ("Largest files", "largest_files", "path"),
+                                  ("By extension", "extensions", "extension"),
+                                  ("By age", "ages", "label")):
+            lines.append(f"  {title}:")
+            lines.extend(f"    {_format_size(item['size']):>10}  {item[label]}" for item in result[key])
+        return "\n".join(lines)
+    if command == "pipeline":
+        done = "would be" if result["dry_run"] else "were"
+        lines = [f"{root}: {result['files_scanned']} files in {result['folders_scanned']} folders, listed once"]
+        for step in result["steps"]:
+            if step["step"] == "organize":
+                lines.append(f"  organize: {step.get('total', step.get('moved'))} files {done} moved")
+            elif step["step"] == "duplicates":
+                if result["dry_run"]:
+                    lines.append(f"  duplicates: {step['duplicate_files']} found, "
+                                 f"{_format_size(step['reclaimable_bytes'])} reclaimable")
+                else:
+                    lines.append(f"  duplicates: {step['removed']} {'linked' if step['hardlink'] else 'removed'}")
+            else:
+                lines.append(f"  empty_folders: {step['total']} {done} removed")
+        return "\n".join(lines)
+    if command == "search":
+        return "\n".join(match["path"] for match in result["matches"])
+    if command == "undo":
+        if "id" in result:
+            state = "undone" if result["undone"] else ("complete" if result["complete"] else "incomplete")
+            return f"{result['id']}  {result['method']}  {result['moves']} moves  {state}  {root}"
+        return "Undo completed."
+    if command == "dedupe" and "duplicate_files" in result:
+        return (f"{root}: {result['duplicate_files']} duplicates in {result['duplicate_groups']} groups, "
+                f"{_format_size(result['reclaimable_bytes'])} reclaimable")
+    if "total" in result:
+        # Dry runs of organize and clean-empty
+        return f"{root}: {result['total']} would be changed"
+    return f"{root}: done"
+
+COMMANDS = {
+    "organize": cmd_organize,
+    "dedupe": cmd_dedupe,
+    "clean-empty": cmd_clean_empty,
+    "pipeline": cmd_pipeline,
+    "search": cmd_search,
+    "storage": cmd_storage,
+    "analyze": cmd_analyze,
+    "undo": cmd_undo
+}
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="print results as JSON")
+    common.add_argument("-q", "--quiet", action="store_true", help="do not echo log lines to stderr")
+    common.add_argument("-j", "--jobs", type=int, default=4, help="roots processed in parallel (default: 4)")
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="File Organizer command line interface.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    organize = commands.add_parser("organize", parents=[common], help="sort files into folders")
+    organize.add_argument("roots", nargs="+")
+    organize.add_argument("--method", default="type", help="type, date or a rule set name (default: type)")
+    organize.add_argument("--dry-run", action="store_true", help="only report what would be moved")
+
+    dedupe = commands.add_parser("dedupe", parents=[common], help="find and remove duplicate files")
+    dedupe.add_argument("roots", nargs="+")
+    dedupe.add_argument("--dry-run", action="store_true", help="only report the duplicates")
+    dedupe.add_argument("--hardlink", action="store_true", help="replace duplicates with hard links")
+    dedupe.add_argument("--algorithm", help="blake2b, sha256 or md5 (default: from config.py)")
+    dedupe.add_argument("--separately", action="store_true",
+                        help="dedupe each root on its own instead of across all of them")
+
+    clean = commands.add_parser("clean-empty", parents=[common], help="remove empty folders")
+    clean.add_argument("roots", nargs="+")
+    clean.add_argument("--dry-run", action="store_true", help="only report the empty folders")
+
+    pipeline = commands.add_parser("pipeline", parents=[common],
+                                   help="organize, dedupe and remove empty folders in one pass over each root")
+    pipeline.add_argument("roots", nargs="+")
+    pipeline.add_argument("--steps", default="organize,duplicates,empty_folders",
+                          help="comma separated steps, run in this order (default: all three)")
+    pipeline.add_argument("--method", default="type", help="organization method (default: type)")
+    pipeline.add_argument("--hardlink", action="store_true", help="replace duplicates with hard links")
+    pipeline.add_argument("--algorithm", help="blake2b, sha256 or md5 (default: from config.py)")
+    pipeline.add_argument("--dry-run", action="store_true", help="only report what each step would do")
+
+    search = commands.add_parser("search", parents=[common], help="search file names (see query.parse_query)")
+    search.add_argument("query")
+    search.add_argument("roots", nargs="+")
+    search.add_argument("--limit", type=int, help="maximum matches per root")
+
+    storage = commands.add_parser("storage", parents=[common], help="total size of each root")
+    storage.add_argument("roots", nargs="+")
+
+    analyze = commands.add_parser("analyze", parents=[common], help="what is using the space in each root")
+    analyze.add_argument("roots", nargs="+")
+    analyze.add_argument("--top", type=int, default=20, help="largest files and folders to list (default: 20)")
+
+    undo = commands.add_parser("undo", parents=[common], help="undo an organization")
+    undo.add_argument("--operation", help="operation ID to undo (default: the newest)")
+    undo.add_argument("--list", action="store_true", help="list journaled operations instead")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.jobs = max(1, args.jobs)
+
+    from logger import set_console
+    set_console(None if args.quiet else sys.stderr)
+
+    try:
+        results = COMMANDS[args.command](args)
+    except UsageError as e:
+        parser.error(str(e))
+    if args.json:
+        json.dump({"command": args.command, "results": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for result in results:
+            text = _describe(args.command, result)
+            if text:
+                print(text)
+    return EXIT_OK if all(result["ok"] for result in results) else EXIT_FAILED
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -5,3 +5,12 @@ FILE_TYPES = {
     "Music": [".mp3", ".wav"],
     "Archives": [".zip", ".rar", ".7z"]
 }
+
+# Custom organize rules, see rules.example.json
+RULES_FILE = "rules.json"
+
+# Content hash used to find duplicates: "blake2b", "sha256" or "md5"
+HASH_ALGORITHM = "blake2b"
+
+# Hash every file copied across devices and compare before deleting the source
+VERIFY_TRANSFERS = False
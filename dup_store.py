@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import tempfile
+from collections import namedtuple
+
+BATCH_SIZE = 5000
+# SQLite page cache per scan, in KiB; the rest of the records stay on disk
+CACHE_KIB = 64 * 1024
+
+# The stat fields the hash cache keys on
+FileStat = namedtuple("FileStat", "st_dev st_ino st_size st_mtime_ns")
+
+class DuplicateStore:
+    """
+    Temporary on-disk table of the files seen by one duplicate scan.
+
+    Records are written in batches and every later step is a query or a
+    paged update, so the scan's memory use does not grow with the number
+    of files. Each inode is stored once: hard links to the same file and
+    files reached through overlapping roots are not duplicates of each
+    other. The file is deleted on close.
+
+    stage marks how far a file got: 1 once its size is shared with
+    another file, 2 once its partial hash is too and it needs a full hash.
+    digest is the final content key that groups are built on.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix="duplicates-", suffix=".db", dir=directory)
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+        self.conn.execute("""
+            CREATE TABLE files (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                stage INTEGER NOT NULL DEFAULT 0,
+                partial TEXT,
+                digest TEXT,
+                UNIQUE (dev, ino)
+            )
+        """)
+        self._pending = []
+        self.bytes_read = 0
+        self.cache_hits = 0
+        self.hash_mb_per_s = 0.0
+
+    def add(self, path, st):
+        self._pending.append((path, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns))
+        if len(self._pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO files (path, dev, ino, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                    self._pending)
+            self._pending = []
+
+    def mark_same_size(self):
+        """
+        Marks files sharing their size with another file for partial
+        hashing. Empty files need no hash and get their digest directly.
+        Returns (files, bytes) marked.
+        """
+        self.flush()
+        with self.conn:
+            self.conn.execute("CREATE INDEX files_size ON files (size)")
+            self.conn.execute("CREATE INDEX files_stage ON files (stage, id)")
+            self.conn.execute(
+                "UPDATE files SET stage = 1 WHERE size IN "
+                "(SELECT size FROM files GROUP BY size HAVING count(*) > 1)")
+            self.conn.execute("UPDATE files SET digest = '', stage = 0 WHERE stage = 1 AND size = 0")
+        return self.conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM files WHERE stage = 1").fetchone()
+
+    def mark_same_partial(self, full_above):
+        """Marks files larger than full_above whose (size, partial hash) still collides for full hashing."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE files SET stage = 2 WHERE stage = 1 AND size > ? AND (size, partial) IN "
+                "(SELECT size, partial FROM files WHERE stage = 1 AND partial IS NOT NULL "
+                "GROUP BY size, partial HAVING count(*) > 1)", (full_above,))
+
+    def iter_stage(self, stage):
+        """Yields the files at stage as lists of up to BATCH_SIZE (id, path, FileStat) tuples."""
+        last = 0
+        while True:
+            rows = self.conn.execute(
+                "SELECT id, path, dev, ino, size, mtime_ns FROM files WHERE stage = ? AND id > ? "
+                "ORDER BY id LIMIT ?", (stage, last, BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            yield [(file_id, path, FileStat(dev, ino, size, mtime_ns))
+                   for file_id, path, dev, ino, size, mtime_ns in rows]
+            last = rows[-1][0]
+
+    def set_partial(self, results, final):
+        """Stores (file id, partial digest) pairs; with final the partial hash is also the content key."""
+        with self.conn:
+            if final:
+                self.conn.executemany("UPDATE files SET partial = ?, digest = ? WHERE id = ?",
+                                      [(digest, digest, file_id) for file_id, digest in results])
+            else:
+                self.conn.executemany("UPDATE files SET partial = ? WHERE id = ?",
+                                      [(digest, file_id) for file_id, digest in results])
+
+    def set_digest(self, results):
+        with self.conn:
+            self.conn.executemany("UPDATE files SET digest = ? WHERE id = ?",
+                                  [(digest, file_id) for file_id, digest in results])
+
+    def count(self):
+        self.flush()
+        return self.conn.execute("SELECT count(*) FROM files").fetchone()[0]
+
+    def iter_groups(self):
+        """Yields (size, [(path, dev), ...]) for each set of identical files, paths sorted."""
+        rows = self.conn.execute(
+            "SELECT size, digest, path, dev FROM files WHERE digest IS NOT NULL AND (size, digest) IN "
+            "(SELECT size, digest FROM files WHERE digest IS NOT NULL GROUP BY size, digest HAVING count(*) > 1) "
+            "ORDER BY size, digest, path")
+        key = None
+        group = []
+        for size, digest, path, dev in rows:
+            if (size, digest) != key:
+                if group:
+                    yield key[0], group
+                key = (size, digest)
+                group = []
+            group.append((path, dev))
+        if group:
+            yield key[0], group
+
+    def close(self):
+        self.conn.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
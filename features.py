@@ -1,134 +1,374 @@
 import os
-import hashlib
-import json
-import shutil
+import stat
+from config import HASH_ALGORITHM
 from logger import log_action
+from dup_store import DuplicateStore
+from hash_cache import HashCache
+from hasher import PARTIAL_HASH_BYTES, HashEngine, hash_file, hash_partial
+from indexer import update_index
+from journal import undo_operation
+from metrics import BYTES_HASHED, CACHE_HITS, CACHE_MISSES, HASH_THROUGHPUT, track_operation
+from scanner import walk
 
-HISTORY_FILE = "history.json"
+def get_file_hash(filepath, algorithm=HASH_ALGORITHM):
+    """Calculates the hash of a file with the given algorithm (BLAKE2b by default)."""
+    try:
+        return hash_file(filepath, algorithm)
+    except OSError as e:
+        log_action(f"Error reading file {filepath}: {e}")
+        return None
 
-def get_file_hash(filepath):
-    """Calculates the MD5 hash of a file."""
-    hasher = hashlib.md5()
+def get_partial_hash(filepath, size, algorithm=HASH_ALGORITHM):
+    """Hashes only the first and last PARTIAL_HASH_BYTES of a file."""
     try:
-        with open(filepath, 'rb') as f:
-            buf = f.read(65536)
-            while len(buf) > 0:
-                hasher.update(buf)
-                buf = f.read(65536)
-        return hasher.hexdigest()
-    except Exception as e:
+        return hash_partial(filepath, size, algorithm)
+    except OSError as e:
         log_action(f"Error reading file {filepath}: {e}")
         return None
 
-def remove_duplicates(path):
-    """Finds and removes duplicate files in the given path based on content."""
-    if not os.path.exists(path):
-        log_action(f"❌ Path does not exist: {path}")
-        return False
-        
-    hashes = {}
-    duplicates_removed = 0
-    
-    for root, _, files in os.walk(path):
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            file_hash = get_file_hash(filepath)
-            
-            if file_hash:
-                if file_hash in hashes:
-                    log_action(f"Removing duplicate: {filepath} (Original: {hashes[file_hash]})")
-                    try:
-                        os.remove(filepath)
-                        duplicates_removed += 1
-                    except Exception as e:
-                        log_action(f"Error removing {filepath}: {e}")
+def _roots(paths):
+    """Accepts one path or a list of them."""
+    return [paths] if isinstance(paths, str) else list(paths)
+
+def regular_files(files):
+    """Yields (entry, lstat result) for the regular files among DirEntries, logging unreadable ones."""
+    for entry in files:
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError as e:
+            log_action(f"Error reading file {entry.path}: {e}")
+            continue
+        if stat.S_ISREG(st.st_mode):
+            yield entry, st
+
+def hash_candidates(store, progress=None, algorithm=HASH_ALGORITHM, locate=None):
+    """
+    Runs the hashing stages of scan_duplicates over the files already
+    added to store, leaving each duplicate with its content digest.
+    locate(path), when given, maps a stored path to the one to read.
+    Returns False if the scan was cancelled through progress.
+    """
+    _, candidate_bytes = store.mark_same_size()
+    if progress is not None:
+        # Upper bound: every same-size candidate might need a full read
+        progress.set_total(bytes=candidate_bytes)
+
+    with HashCache() as cache, HashEngine(algorithm) as engine:
+        # Stage 2 hashes the head and tail of each same-size candidate, which
+        # already covers small files; stage 3 fully hashes large files whose
+        # partial hashes still collide
+        for stage, kind in ((1, "partial"), (2, "full")):
+            if stage == 2:
+                store.mark_same_partial(2 * PARTIAL_HASH_BYTES)
+            # Digests of different algorithms must never be mixed up in the cache
+            cache_kind = f"{kind}:{algorithm}"
+            for page in store.iter_stage(stage):
+                if progress is not None and progress.cancelled():
+                    return False
+
+                hashed = []
+                misses = {}
+                for file_id, filepath, st in page:
+                    digest = cache.get(st, cache_kind)
+                    if digest is None:
+                        misses[file_id] = (filepath, st)
+                    else:
+                        hashed.append((file_id, digest, st.st_size))
+
+                jobs = ((file_id, locate(filepath) if locate else filepath, st.st_size)
+                        for file_id, (filepath, st) in misses.items())
+                for file_id, digest, read, error in engine.hash_many(jobs, kind):
+                    filepath, st = misses[file_id]
+                    store.bytes_read += read
+                    BYTES_HASHED.inc(read)
+                    if progress is not None:
+                        if progress.cancelled():
+                            return False
+                        progress.advance(bytes=read)
+                    if digest is None:
+                        log_action(f"Error reading file {filepath}: {error}")
+                        continue
+                    cache.put(st, cache_kind, digest)
+                    hashed.append((file_id, digest, st.st_size))
+
+                if kind == "partial":
+                    # For small files the partial hash already covers the whole file
+                    store.set_partial([(i, d) for i, d, size in hashed if size > 2 * PARTIAL_HASH_BYTES], final=False)
+                    store.set_partial([(i, d) for i, d, size in hashed if size <= 2 * PARTIAL_HASH_BYTES], final=True)
                 else:
-                    hashes[file_hash] = filepath
-                    
-    log_action(f"✅ Removed {duplicates_removed} duplicate files.")
-    return True
+                    store.set_digest([(i, d) for i, d, _ in hashed])
 
-def remove_empty_folders(path):
-    """Recursively removes empty folders in the given path."""
-    if not os.path.exists(path):
-        log_action(f"❌ Path does not exist: {path}")
-        return False
-        
-    empty_folders_removed = 0
-    
-    # Bottom-up approach ensures nested empty folders are removed
-    for root, dirs, _ in os.walk(path, topdown=False):
-        for dirname in dirs:
-            dirpath = os.path.join(root, dirname)
-            try:
-                if not os.listdir(dirpath):
-                    os.rmdir(dirpath)
-                    log_action(f"Removed empty folder: {dirpath}")
-                    empty_folders_removed += 1
-            except Exception as e:
-                log_action(f"Error removing folder {dirpath}: {e}")
-                
-    log_action(f"✅ Removed {empty_folders_removed} empty folders.")
+        store.cache_hits = cache.hits
+        CACHE_HITS.inc(cache.hits, cache="hash")
+        CACHE_MISSES.inc(cache.misses, cache="hash")
+        store.hash_mb_per_s = engine.throughput()
+        if engine.bytes_read:
+            HASH_THROUGHPUT.set(round(store.hash_mb_per_s, 1), algorithm=algorithm)
+            log_action(f"Hashed {engine.bytes_read / (1024 * 1024):.1f} MB with {algorithm} "
+                       f"at {store.hash_mb_per_s:.1f} MB/s")
     return True
 
-def save_history(history_data):
-    """Saves organization history to allow undo{updated}."""
+def scan_duplicates(paths, progress=None, algorithm=HASH_ALGORITHM):
+    """
+    Runs the duplicate detection stages over one or more roots and returns
+    the DuplicateStore holding the result (the caller closes it), or None
+    if a root does not exist or the scan was cancelled through progress.
+
+    Files are first grouped by size, then candidates sharing a size are
+    compared by a hash of their first and last few KB, and only files that
+    still collide are hashed in full. Every record lives in the store's
+    temporary database rather than in memory. Hashes are looked up in the
+    persistent hash cache first, so unchanged files are not read again on
+    later scans; the rest are hashed in parallel by a hasher.HashEngine
+    with the given algorithm.
+    """
+    roots = _roots(paths)
+    for root in roots:
+        if not os.path.exists(root):
+            log_action(f"❌ Path does not exist: {root}")
+            return None
+
+    store = DuplicateStore()
     try:
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(history_data, f, indent=4)
-        log_action("History saved for potential undo.")
-    except Exception as e:
-        log_action(f"Error saving history: {e}")
-
-def load_history():
-    """Loads organization history."""
-    if not os.path.exists(HISTORY_FILE):
-        return []
-        
+        # Stage 1: record every regular file, no file contents are read
+        for root in roots:
+            for _, _, files in walk(root):
+                if progress is not None:
+                    if progress.cancelled():
+                        store.close()
+                        return None
+                    progress.advance(files=len(files))
+                for entry, st in regular_files(files):
+                    store.add(entry.path, st)
+
+        if not hash_candidates(store, progress, algorithm):
+            store.close()
+            return None
+    except BaseException:
+        store.close()
+        raise
+    return store
+
+def find_duplicates(paths, progress=None, limit=1000, algorithm=HASH_ALGORITHM):
+    """
+    Finds files with identical content below one or more roots without
+    deleting anything. Returns a report dict with the totals and the first
+    limit duplicate groups, or None if a root does not exist or the scan
+    was cancelled. The first path of each group (alphabetically) is the
+    one that would be kept.
+    """
+    store = scan_duplicates(paths, progress, algorithm)
+    if store is None:
+        return None
+    with store:
+        return duplicate_report(store, limit, algorithm)
+
+def duplicate_report(store, limit=1000, algorithm=HASH_ALGORITHM):
+    """The find_duplicates report for a store that hash_candidates has run on."""
+    report = {
+        "files_scanned": store.count(),
+        "groups": [],
+        "duplicate_groups": 0,
+        "duplicate_files": 0,
+        "reclaimable_bytes": 0,
+        "bytes_read": store.bytes_read,
+        "cache_hits": store.cache_hits,
+        "algorithm": algorithm,
+        "hash_mb_per_s": round(store.hash_mb_per_s, 1)
+    }
+    for size, group in store.iter_groups():
+        if len(report["groups"]) < limit:
+            report["groups"].append({
+                "size": size,
+                "original": group[0][0],
+                "duplicates": [path for path, _ in group[1:]]
+            })
+        report["duplicate_groups"] += 1
+        report["duplicate_files"] += len(group) - 1
+        report["reclaimable_bytes"] += size * (len(group) - 1)
+    return report
+
+def _replace_with_link(original, duplicate):
+    """Atomically swaps duplicate for a hard link to original."""
+    temp_path = f"{duplicate}.{os.getpid()}.link"
+    os.link(original, temp_path)
     try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as e:
-        log_action(f"Error loading history: {e}")
-        return []
-
-def undo_last_organization():
-    """Undoes the last file organization using history.json."""
-    history = load_history()
-    if not history:
-        log_action("❌ No history available to undo.")
-        return False
-        
-    log_action("Starting undo operation...")
-    files_restored = 0
-    errors = 0
-    
-    for entry in history:
-        source = entry.get("source")
-        destination = entry.get("destination")
-        
-        if source and destination and os.path.exists(destination):
+        os.replace(temp_path, duplicate)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+def remove_duplicates(paths, dry_run=False, progress=None, hardlink=False, algorithm=HASH_ALGORITHM):
+    """
+    Finds and removes duplicate files below one or more roots based on content.
+    With dry_run the duplicates are only reported and the report is returned.
+    With hardlink each duplicate is replaced by a hard link to the kept copy
+    instead of being deleted; hard links cannot cross filesystems, so each
+    filesystem keeps its own first copy.
+    """
+    with track_operation("find_duplicates" if dry_run else "remove_duplicates") as run:
+        if dry_run:
+            report = find_duplicates(paths, progress=progress, algorithm=algorithm)
+            if report is None:
+                return None
+            run.files = report["files_scanned"]
+            for group in report["groups"]:
+                for filepath in group["duplicates"]:
+                    log_action(f"Would remove duplicate: {filepath} (Original: {group['original']})")
+            log_action(f"✅ Found {report['duplicate_files']} duplicate files "
+                       f"({report['reclaimable_bytes']} bytes reclaimable).")
+            return report
+
+        store = scan_duplicates(paths, progress, algorithm)
+        if store is None:
+            return False
+
+        with store:
+            run.files = store.count()
+            delete_duplicates(store, hardlink, progress)
+        return True
+
+def iter_duplicates(group, hardlink=False):
+    """
+    Yields (duplicate, original) for one group from DuplicateStore.iter_groups.
+    The first path of the group is kept, or the first one on each
+    filesystem when linking.
+    """
+    kept = {}
+    for filepath, dev in group:
+        original = kept.setdefault(dev if hardlink else None, filepath)
+        if original != filepath:
+            yield filepath, original
+
+def delete_duplicates(store, hardlink=False, progress=None, on_removed=None):
+    """
+    Deletes (or with hardlink, links) every duplicate in a store that
+    hash_candidates has run on and returns how many were handled.
+    on_removed(path) is called after each file that was deleted, and the
+    search index drops them at the end.
+    """
+    duplicates_removed = 0
+    deleted = []
+    for _, group in store.iter_groups():
+        if progress is not None and progress.cancelled():
+            break
+        for filepath, original in iter_duplicates(group, hardlink):
             try:
-                # Ensure original directory structure exists
-                original_dir = os.path.dirname(source)
-                os.makedirs(original_dir, exist_ok=True)
-                
-                shutil.move(destination, source)
-                log_action(f"Restored: {os.path.basename(source)}")
-                files_restored += 1
+                if hardlink:
+                    log_action(f"Linking duplicate: {filepath} (Original: {original})")
+                    _replace_with_link(original, filepath)
+                else:
+                    log_action(f"Removing duplicate: {filepath} (Original: {original})")
+                    os.remove(filepath)
+                    deleted.append(filepath)
+                    if on_removed is not None:
+                        on_removed(filepath)
+                duplicates_removed += 1
             except Exception as e:
-                log_action(f"Error restoring {destination}: {e}")
+                log_action(f"Error removing {filepath}: {e}")
+
+    update_index(removed=deleted)
+    verb = "Linked" if hardlink else "Removed"
+    log_action(f"✅ {verb} {duplicates_removed} duplicate files.")
+    return duplicates_removed
+
+def remove_empty_folders(path, progress=None, dry_run=False, limit=1000):
+    """
+    Removes every empty folder below path, including folders that only
+    become empty once their empty subfolders are gone.
+
+    The tree is listed exactly once. Each directory starts with a count of
+    its entries from that listing; directories are then visited deepest
+    first and one whose count has dropped to zero is removed, which in turn
+    lowers its parent's count, so whole empty chains go without listing
+    anything again. With dry_run nothing is removed and a report of the
+    folders that would be (the first limit of them) is returned instead.
+    """
+    with track_operation("find_empty_folders" if dry_run else "remove_empty_folders") as run:
+        if not os.path.exists(path):
+            log_action(f"❌ Path does not exist: {path}")
+            return None if dry_run else False
+
+        # dirpath -> (parent, entries left), filled from the single listing
+        remaining = {}
+        # Symlinks to directories are listed too, they keep their folder non-empty
+        for dirpath, dirs, files in walk(path, links=True):
+            if progress is not None:
+                if progress.cancelled():
+                    return None if dry_run else True
+                progress.advance(files=len(dirs))
+            count_entries(remaining, dirpath, dirs, files)
+        run.files = len(remaining)
+
+        removed, errors = prune_empty_folders(remaining, progress, dry_run)
+
+        if dry_run:
+            for dirpath in removed[:limit]:
+                log_action(f"Would remove empty folder: {dirpath}")
+            log_action(f"✅ Found {len(removed)} empty folders.")
+            return {"total": len(removed), "folders": removed[:limit]}
+
+        if errors:
+            log_action(f"⚠️ Removed {len(removed)} empty folders, {errors} could not be removed.")
+        else:
+            log_action(f"✅ Removed {len(removed)} empty folders.")
+        return True
+
+def count_entries(remaining, dirpath, dirs, files):
+    """Records one walk(links=True) listing in the remaining table of prune_empty_folders."""
+    parent = remaining.get(dirpath)
+    remaining[dirpath] = [parent[0] if parent else None, len(dirs) + len(files)]
+    for entry in dirs:
+        remaining[entry.path] = [dirpath, 0]
+
+def prune_empty_folders(remaining, progress=None, dry_run=False):
+    """
+    The removal half of remove_empty_folders. remaining maps each folder
+    to [parent, entries left] (parent None for the root, which is never
+    removed); counts are lowered as folders go. Returns (removed folders,
+    number that could not be removed).
+    """
+    removed = []
+    errors = 0
+    for dirpath in sorted(remaining, key=lambda p: p.count(os.sep), reverse=True):
+        parent, count = remaining[dirpath]
+        if count or parent is None:
+            continue
+        if progress is not None and progress.cancelled():
+            break
+        if not dry_run:
+            try:
+                os.rmdir(dirpath)
+            except OSError as e:
+                # Not empty after all (or not removable), so its parent keeps it
+                log_action(f"Error removing folder {dirpath}: {e}")
                 errors += 1
-        elif not os.path.exists(destination):
-            log_action(f"Warning: File not found at destination: {destination}")
-            errors += 1
-            
-    # Clear history after undo
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
-        
-    if errors == 0:
-        log_action(f"✅ Undo completed successfully. Restored {files_restored} files.")
-    else:
-        log_action(f"⚠️ Undo completed with {errors} errors. Restored {files_restored} files.")
-    return True
+                continue
+            log_action(f"Removed empty folder: {dirpath}")
+        removed.append(dirpath)
+        remaining[parent][1] -= 1
+    if not dry_run:
+        update_index(removed=removed)
+    return removed, errors
+
+def undo_last_organization(progress=None, operation_id=None):
+    """
+    Undoes the newest organization that has not been undone yet (or the
+    given operation) by replaying its journal in reverse.
+    """
+    with track_operation("undo") as run:
+        log_action("Starting undo operation...")
+        outcome = undo_operation(operation_id, progress=progress)
+        if outcome is None:
+            log_action("❌ No history available to undo.")
+            return False
+
+        files_restored, errors, cancelled = outcome
+        run.files = files_restored
+        if cancelled:
+            log_action(f"⚠️ Undo cancelled. Restored {files_restored} files.")
+        elif errors == 0:
+            log_action(f"✅ Undo completed successfully. Restored {files_restored} files.")
+        else:
+            log_action(f"⚠️ Undo completed with {errors} errors. Restored {files_restored} files.")
+        return True
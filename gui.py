@@ -1,13 +1,55 @@
 import os
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+import queue
 import threading
+import tkinter as tk
+from collections import deque
+from tkinter import filedialog, messagebox, scrolledtext, ttk
 
 # Import backend modules
 from organizer import organize_files
 from features import remove_duplicates, remove_empty_folders, undo_last_organization
 from logger import set_log_callback
 
+# How often the main loop moves queued log lines into the widget
+LOG_REFRESH_MS = 100
+# Lines kept in the log widget; older ones are dropped
+MAX_LOG_LINES = 5000
+
+class TaskProgress:
+    """
+    Progress counters for one background task, with the interface the
+    backend expects from its progress argument (see jobs.Job). Worker
+    threads only update numbers; the main loop reads them on its timer.
+    """
+
+    def __init__(self):
+        self.files_done = 0
+        self.files_total = None
+        self.bytes_done = 0
+        self.finished = False
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def advance(self, files=0, bytes=0):
+        with self._lock:
+            self.files_done += files
+            self.bytes_done += bytes
+
+    def set_total(self, files=None, bytes=None):
+        with self._lock:
+            if files is not None:
+                self.files_total = files
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def read(self):
+        with self._lock:
+            return self.files_done, self.files_total, self.bytes_done
+
 class OrganizerApp:
     def __init__(self, root):
         self.root = root
@@ -17,11 +59,17 @@ class OrganizerApp:
         
         self.target_path = tk.StringVar()
         self.org_method = tk.StringVar(value="type") # Default to type
-        
+        self.progress_text = tk.StringVar(value="Idle")
+        self.task = None
+
+        # Worker threads only ever put lines here; the main loop drains it
+        self.log_queue = queue.SimpleQueue()
+
         self.setup_ui()
         
         # Connect logger to our GUI text area
-        set_log_callback(self.append_log)
+        set_log_callback(self.log_queue.put)
+        self.root.after(LOG_REFRESH_MS, self.refresh)
         
     def setup_ui(self):
         # Header
@@ -72,6 +120,16 @@ class OrganizerApp:
         tk.Button(btn_frame, text="Remove Duplicates", command=self.run_remove_duplicates).pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
         tk.Button(btn_frame, text="Delete Empty Folders", command=self.run_remove_empty_folders).pack(side=tk.RIGHT, expand=True, fill=tk.X, padx=5)
 
+        # Progress of the running task
+        progress_frame = tk.Frame(self.root)
+        progress_frame.pack(fill=tk.X, pady=(5, 0))
+
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        self.cancel_btn = tk.Button(progress_frame, text="Cancel", command=self.cancel_task, state='disabled')
+        self.cancel_btn.pack(side=tk.RIGHT)
+        tk.Label(self.root, textvariable=self.progress_text, font=("Helvetica", 9)).pack(anchor=tk.W)
+
         # Logs Console
         tk.Label(self.root, text="Activity Log:", font=("Helvetica", 10, "bold")).pack(anchor=tk.W, pady=(15, 5))
         
@@ -84,15 +142,72 @@ class OrganizerApp:
             self.target_path.set(folder)
             
     def append_log(self, text):
-        self.log_area.config(state='normal')
-        self.log_area.insert(tk.END, text + "\n")
-        self.log_area.see(tk.END)
-        self.log_area.config(state='disabled')
-        # Use simple try-except in case app is closing
+        """Safe to call from any thread; the line shows up on the next refresh."""
+        self.log_queue.put(text)
+
+    def refresh(self):
+        """Runs on the main loop every LOG_REFRESH_MS: flushes queued log lines and updates the progress bar."""
         try:
-            self.root.update_idletasks() # Ensure GUI refreshes
-        except:
+            self.flush_logs()
+            self.update_progress()
+        finally:
+            self.root.after(LOG_REFRESH_MS, self.refresh)
+
+    def flush_logs(self):
+        # Only the newest MAX_LOG_LINES can end up on screen, so a huge
+        # backlog costs one insert rather than one per line
+        lines = deque(maxlen=MAX_LOG_LINES)
+        try:
+            while True:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
             pass
+        if not lines:
+            return
+
+        # Follow the end only if the user has not scrolled up to read
+        at_bottom = self.log_area.yview()[1] >= 0.999
+        self.log_area.config(state='normal')
+        self.log_area.insert(tk.END, "\n".join(lines) + "\n")
+        excess = int(self.log_area.index("end-1c").split(".")[0]) - 1 - MAX_LOG_LINES
+        if excess > 0:
+            self.log_area.delete("1.0", f"{excess + 1}.0")
+        self.log_area.config(state='disabled')
+        if at_bottom:
+            self.log_area.see(tk.END)
+
+    def update_progress(self):
+        task = self.task
+        if task is None:
+            return
+        done, total, bytes_done = task.read()
+        if total:
+            if str(self.progress_bar["mode"]) != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.config(mode="determinate")
+            self.progress_bar.config(maximum=total, value=min(done, total))
+            text = f"{done}/{total} items"
+        else:
+            # The total is not known yet, so just show that work is happening
+            if str(self.progress_bar["mode"]) != "indeterminate":
+                self.progress_bar.config(mode="indeterminate")
+                self.progress_bar.start(LOG_REFRESH_MS)
+            text = f"{done} items"
+        if bytes_done:
+            text += f", {bytes_done / (1024 * 1024):.1f} MB"
+
+        if task.finished:
+            self.task = None
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate", maximum=1, value=1 if total or done else 0)
+            self.cancel_btn.config(state='disabled')
+            text = ("Cancelled: " if task.cancelled() else "Done: ") + text
+        self.progress_text.set(text)
+
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.append_log("Cancelling...")
 
     def get_path_or_warn(self):
         path = self.target_path.get()
@@ -103,9 +218,20 @@ class OrganizerApp:
 
     def execute_task(self, task_func, *args):
         """Runs a task in a separate thread so GUI doesn't freeze."""
+        task = TaskProgress()
+
         def wrapper():
-            task_func(*args)
-        
+            try:
+                task_func(*args, progress=task)
+            except Exception as e:
+                self.append_log(f"❌ Task failed: {e}")
+            finally:
+                task.finished = True
+
+        # Only the newest task drives the progress bar
+        self.task = task
+        self.progress_bar.config(mode="determinate", value=0)
+        self.cancel_btn.config(state='normal')
         threading.Thread(target=wrapper, daemon=True).start()
 
     def run_organize(self):
@@ -0,0 +1,111 @@
+import sqlite3
+import time
+from logger import log_action
+
+CACHE_FILE = "hash_cache.db"
+MAX_ENTRIES = 1000000
+FLUSH_EVERY = 1000
+# Refreshing last_used costs a write, so hits only touch rows older than this
+TOUCH_INTERVAL = 3600
+
+class HashCache:
+    """
+    Persistent cache of file content hashes keyed on (device, inode, kind).
+
+    An entry is only valid while the file's size and mtime_ns still match,
+    so changed files miss and are re-hashed. Each scan opens its own
+    instance; SQLite's WAL locking makes concurrent scans safe, and writes
+    are buffered and flushed in batches. When the table grows past
+    max_entries the least recently used rows are evicted.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._touched = []
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (dev, ino, kind)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)")
+        self.conn.commit()
+
+    def get(self, st, kind):
+        """Returns the cached digest for a stat result, or None if missing or stale."""
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, digest, last_used FROM hashes WHERE dev = ? AND ino = ? AND kind = ?",
+            (st.st_dev, st.st_ino, kind)).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        now = time.time()
+        if now - row[3] > TOUCH_INTERVAL:
+            self._touched.append((now, st.st_dev, st.st_ino, kind))
+        return row[2]
+
+    def put(self, st, kind, digest):
+        """Queues a digest for the file described by st, replacing any stale entry."""
+        self._pending.append((st.st_dev, st.st_ino, kind, st.st_size, st.st_mtime_ns, digest, time.time()))
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Writes queued entries in a single transaction."""
+        if not self._pending and not self._touched:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO hashes (dev, ino, kind, size, mtime_ns, digest, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+                self.conn.executemany(
+                    "UPDATE hashes SET last_used = ? WHERE dev = ? AND ino = ? AND kind = ?", self._touched)
+        except sqlite3.Error as e:
+            log_action(f"⚠️ Could not update hash cache: {e}")
+        self._pending = []
+        self._touched = []
+
+    def evict(self):
+        """Deletes the least recently used entries beyond max_entries."""
+        count = self.conn.execute("SELECT count(*) FROM hashes").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        # Trim a little further so the next scans do not evict again immediately
+        excess += self.max_entries // 10
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM hashes WHERE rowid IN "
+                "(SELECT rowid FROM hashes ORDER BY last_used LIMIT ?)", (excess,))
+        return excess
+
+    def close(self):
+        """Flushes pending writes, enforces the size bound and closes the database."""
+        try:
+            self.flush()
+            self.evict()
+        except sqlite3.Error as e:
+            log_action(f"⚠️ Could not update hash cache: {e}")
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+ALGORITHMS = {
+    "blake2b": hashlib.blake2b,
+    "sha256": hashlib.sha256,
+    "md5": hashlib.md5
+}
+DEFAULT_ALGORITHM = "blake2b"
+BUFFER_SIZE = 1024 * 1024
+PARTIAL_HASH_BYTES = 4096
+# hashlib releases the GIL while digesting, so threads hash on every core;
+# the extra threads keep the disk busy while others wait on reads
+WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+_local = threading.local()
+
+def _buffer():
+    """One read buffer per thread, allocated once and reused for every file."""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = memoryview(bytearray(BUFFER_SIZE))
+    return buffer
+
+def _new_hasher(algorithm):
+    try:
+        return ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"unknown hash algorithm: {algorithm}")
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM):
+    """Hashes a whole file through the thread's reusable buffer. Raises OSError."""
+    hasher = _new_hasher(algorithm)
+    buffer = _buffer()
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            hasher.update(buffer[:count])
+    return hasher.hexdigest()
+
+def hash_partial(path, size, algorithm=DEFAULT_ALGORITHM):
+    """Hashes only the first and last PARTIAL_HASH_BYTES of a file. Raises OSError."""
+    hasher = _new_hasher(algorithm)
+    buffer = _buffer()[:PARTIAL_HASH_BYTES]
+    with open(path, "rb", buffering=0) as f:
+        hasher.update(buffer[:f.readinto(buffer)])
+        if size > PARTIAL_HASH_BYTES:
+            f.seek(max(PARTIAL_HASH_BYTES, size - PARTIAL_HASH_BYTES))
+            hasher.update(buffer[:f.readinto(buffer)])
+    return hasher.hexdigest()
+
+def _hash_job(path, size, kind, algorithm):
+    """Runs in a worker thread; returns (digest or None, error message or None)."""
+    try:
+        if kind == "partial":
+            return hash_partial(path, size, algorithm), None
+        return hash_file(path, algorithm), None
+    except OSError as e:
+        return None, str(e)
+
+class HashEngine:
+    """
+    Hashes many files at once with one algorithm on a pool of threads.
+
+    Each thread reads through its own reusable buffer, so hashing a file
+    allocates nothing per chunk. Bytes read and the time spent are
+    accumulated so throughput() can report MB/s.
+    """
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, threads=WORKERS):
+        _new_hasher(algorithm)
+        self.algorithm = algorithm
+        self.bytes_read = 0
+        self.seconds = 0.0
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="hash")
+
+    def hash_many(self, items, kind="full"):
+        """
+        Hashes (key, path, size) items and yields (key, digest, bytes read,
+        error) as each finishes, in no particular order. digest is None and
+        error holds the reason when a file could not be read.
+        """
+        start = time.perf_counter()
+        futures = {}
+        for key, path, size in items:
+            futures[self._threads.submit(_hash_job, path, size, kind, self.algorithm)] = (key, size)
+
+        try:
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, size = futures.pop(future)
+                    digest, error = future.result()
+                    read = min(size, 2 * PARTIAL_HASH_BYTES) if kind == "partial" else size
+                    read = read if digest is not None else 0
+                    self.bytes_read += read
+                    yield key, digest, read, error
+        finally:
+            for future in futures:
+                future.cancel()
+            self.seconds += time.perf_counter() - start
+
+    def throughput(self):
+        """MB/s over the time spent in hash_many so far."""
+        if not self.seconds:
+            return 0.0
+        return self.bytes_read / (1024 * 1024) / self.seconds
+
+    def close(self):
+        self._threads.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Hash files and report throughput.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--algorithm", default=DEFAULT_ALGORITHM, choices=sorted(ALGORITHMS))
+    args = parser.parse_args()
+
+    with HashEngine(args.algorithm) as engine:
+        items = ((path, path, os.path.getsize(path)) for path in args.paths if os.path.isfile(path))
+        for path, digest, _, error in engine.hash_many(items):
+            print(f"{digest}  {path}" if digest else f"error: {path}: {error}")
+        print(f"{engine.bytes_read / (1024 * 1024):.1f} MB at {engine.throughput():.1f} MB/s ({args.algorithm})")
@@ -0,0 +1,339 @@
+import os
+import sqlite3
+import threading
+import time
+from logger import log_action
+from metrics import CACHE_HITS, CACHE_MISSES
+from scanner import iter_files, iter_files_sorted
+
+INDEX_FILE = "file_index.db"
+BATCH_SIZE = 5000
+
+# SQLite connections are cheap; the lock only serialises index rebuilds
+_build_lock = threading.Lock()
+# Whether this SQLite has the FTS5 trigram tokenizer (3.34+), checked on first connect
+_has_trigrams = None
+
+def _connect():
+    """Opens the index database, creating the schema on first use."""
+    conn = sqlite3.connect(INDEX_FILE, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS roots (
+            root TEXT PRIMARY KEY,
+            indexed_at REAL NOT NULL,
+            file_count INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            root TEXT NOT NULL,
+            name TEXT NOT NULL,
+            name_lower TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER,
+            mtime REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS files_root ON files (root, path)")
+    _ensure_trigrams(conn)
+    return conn
+
+def _ensure_trigrams(conn):
+    """
+    Creates the trigram index over file names when SQLite supports it,
+    filling it from the files table for indexes built before it existed.
+    """
+    global _has_trigrams
+    if _has_trigrams is False:
+        return
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'names'").fetchone()
+    if exists:
+        _has_trigrams = True
+        return
+    try:
+        with conn:
+            conn.execute("CREATE VIRTUAL TABLE names USING fts5(name_lower, tokenize='trigram')")
+            conn.execute("INSERT INTO names (rowid, name_lower) SELECT id, name_lower FROM files")
+        _has_trigrams = True
+    except sqlite3.OperationalError:
+        _has_trigrams = False
+
+def _containing_root(path, roots):
+    best = None
+    for root in roots:
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            if best is None or len(root) > len(best):
+                best = root
+    return best
+
+def _storable(path):
+    """False for paths with bytes that are not UTF-8 (surrogate escapes in Python), which SQLite cannot store."""
+    try:
+        path.encode("utf-8")
+        return True
+    except UnicodeEncodeError:
+        return False
+
+def _skip_unstorable(path):
+    log_action(f"⚠️ Not indexing {os.fsencode(path).decode('utf-8', 'replace')}: the name is not valid UTF-8")
+
+def _indexed_roots(conn):
+    return [root for (root,) in conn.execute("SELECT root FROM roots")]
+
+def find_indexed_root(path):
+    """Returns the indexed root that contains path, or None if it is not indexed."""
+    path = os.path.abspath(path)
+    try:
+        conn = _connect()
+    except sqlite3.Error:
+        return None
+    try:
+        roots = _indexed_roots(conn)
+    finally:
+        conn.close()
+    return _containing_root(path, roots)
+
+def build_index(path):
+    """Walks path once and stores name, path, size and mtime of every file."""
+    root = os.path.abspath(path)
+    if not os.path.isdir(root):
+        log_action(f"❌ Cannot index, not a directory: {root}")
+        return None
+
+    with _build_lock:
+        start = time.time()
+        conn = _connect()
+        file_count = 0
+        try:
+            with conn:
+                if _has_trigrams:
+                    conn.execute("DELETE FROM names WHERE rowid IN (SELECT id FROM files WHERE root = ?)", (root,))
+                conn.execute("DELETE FROM files WHERE root = ?", (root,))
+                conn.execute("DELETE FROM roots WHERE root = ?", (root,))
+
+                batch = []
+                for entry in iter_files(root):
+                    if not _storable(entry.path):
+                        _skip_unstorable(entry.path)
+                        continue
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        size, mtime = st.st_size, st.st_mtime
+                    except OSError:
+                        size, mtime = None, None
+                    batch.append((root, entry.name, entry.name.lower(), entry.path, size, mtime))
+                    if len(batch) >= BATCH_SIZE:
+                        conn.executemany(
+                            "INSERT INTO files (root, name, name_lower, path, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                            batch)
+                        file_count += len(batch)
+                        batch = []
+                if batch:
+                    conn.executemany(
+                        "INSERT INTO files (root, name, name_lower, path, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                        batch)
+                    file_count += len(batch)
+
+                if _has_trigrams:
+                    conn.execute("INSERT INTO names (rowid, name_lower) SELECT id, name_lower FROM files WHERE root = ?",
+                                 (root,))
+                conn.execute("INSERT INTO roots (root, indexed_at, file_count) VALUES (?, ?, ?)",
+                             (root, time.time(), file_count))
+        except Exception as e:
+            log_action(f"❌ Error building index for {root}: {e}")
+            return None
+        finally:
+            conn.close()
+
+    log_action(f"✅ Indexed {file_count} files under {root} in {time.time() - start:.1f}s")
+    return file_count
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def _like_suffix(ext):
+    return "%" + ext.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_index(path, query, after=None):
+    """
+    Returns an iterator of (name, path, size) rows matching a query.SearchQuery,
+    ordered by path and starting after the given path, or None when path is
+    not covered by an index and the caller must walk instead.
+
+    Name terms of three or more characters are looked up in the trigram
+    index instead of scanning every name; extension, size and mtime
+    filters are applied in SQL, and glob and regex filters on the rows
+    SQLite returns.
+    """
+    root = find_indexed_root(path)
+    if root is None:
+        return None
+
+    path = os.path.abspath(path)
+    sql = "SELECT name, path, size FROM files WHERE root = ?"
+    params = [root]
+
+    terms = list(query.terms)
+    trigram_terms = [term for term in terms if len(term) >= 3] if _has_trigrams else []
+    if trigram_terms:
+        sql += " AND id IN (SELECT rowid FROM names WHERE names MATCH ?)"
+        params.append(" AND ".join(_fts_phrase(term) for term in trigram_terms))
+    for term in terms:
+        if term not in trigram_terms:
+            sql += " AND instr(name_lower, ?) > 0"
+            params.append(term)
+    if query.extensions:
+        sql += " AND (" + " OR ".join("name_lower LIKE ? ESCAPE '\\'" for _ in query.extensions) + ")"
+        params += [_like_suffix(ext) for ext in sorted(query.extensions)]
+    for column, low, high in (("size", query.min_size, query.max_size),
+                              ("mtime", query.modified_after, query.modified_before)):
+        if low is not None:
+            sql += f" AND {column} >= ?"
+            params.append(low)
+        if high is not None:
+            sql += f" AND {column} <= ?"
+            params.append(high)
+
+    if path != root:
+        # Restrict to the requested subtree using the (root, path) index
+        prefix = path.rstrip(os.sep) + os.sep
+        sql += " AND path >= ? AND path < ?"
+        params += [prefix, prefix + "\U0010ffff"]
+    if after:
+        sql += " AND path > ?"
+        params.append(after)
+    sql += " ORDER BY path"
+
+    rows = _iter_rows(sql, params)
+    if query.glob or query.regex or query.extensions:
+        # LIKE on the extension also accepts names like ".pdf"; match_name has the exact rules
+        return (row for row in rows if query.match_name(row[0]))
+    return rows
+
+def iter_search(base_path, query, cursor=None):
+    """
+    Yields (name, path, size_bytes, cursor) for every file matching a
+    query.SearchQuery, resuming after cursor. Cursors are tagged with the
+    backend that produced them so a page started on a live walk keeps
+    walking even if an index appears meanwhile.
+    """
+    backend, _, after = (cursor or "").partition(":")
+
+    if backend != "walk":
+        indexed = search_index(base_path, query, after=after if backend == "index" else None)
+        if indexed is not None:
+            CACHE_HITS.inc(cache="search_index")
+            for name, full_path, size_bytes in indexed:
+                if not os.path.lexists(full_path):
+                    # Changed by something other than this app since it was indexed
+                    continue
+                yield name, full_path, size_bytes, f"index:{full_path}"
+            return
+        CACHE_MISSES.inc(cache="search_index")
+
+    after_parts = after.split(os.sep) if backend == "walk" and after else None
+    for entry in iter_files_sorted(base_path, after_parts):
+        # Name filters first, so only candidates cost a stat
+        if query.match_name(entry.name):
+            # Get size safely
+            try:
+                st = entry.stat()
+                size_bytes, mtime = st.st_size, st.st_mtime
+            except OSError:
+                size_bytes, mtime = None, None
+            if query.needs_stat and not query.match_stat(size_bytes, mtime):
+                continue
+            rel_path = os.path.relpath(entry.path, base_path)
+            yield entry.name, entry.path, size_bytes, f"walk:{rel_path}"
+
+def _iter_rows(sql, params):
+    """Streams rows lazily so the first page does not wait for the whole query."""
+    conn = _connect()
+    try:
+        for row in conn.execute(sql, params):
+            yield row
+    finally:
+        conn.close()
+
+def drop_index(path):
+    """Removes the index for a root so searches fall back to a live walk."""
+    root = os.path.abspath(path)
+    conn = _connect()
+    try:
+        with conn:
+            if _has_trigrams:
+                conn.execute("DELETE FROM names WHERE rowid IN (SELECT id FROM files WHERE root = ?)", (root,))
+            conn.execute("DELETE FROM files WHERE root = ?", (root,))
+            deleted = conn.execute("DELETE FROM roots WHERE root = ?", (root,)).rowcount
+    finally:
+        conn.close()
+    return deleted > 0
+
+def _delete_rows(conn, sql, params):
+    if _has_trigrams:
+        conn.execute(f"DELETE FROM names WHERE rowid IN (SELECT id FROM files WHERE {sql})", params)
+    conn.execute(f"DELETE FROM files WHERE {sql}", params)
+
+def update_index(moved=(), removed=()):
+    """
+    Keeps the indexed roots in step with changes the app makes itself, so
+    searches never return files that were moved or deleted. moved holds
+    (source, destination) pairs of files; removed holds deleted files or
+    folders, whose rows are dropped along with everything below them.
+    Paths outside every indexed root are ignored.
+    """
+    moved = list(moved)
+    removed = list(removed)
+    if not moved and not removed:
+        return
+    with _build_lock:
+        try:
+            conn = _connect()
+        except sqlite3.Error as e:
+            log_action(f"❌ Error updating the search index: {e}")
+            return
+        try:
+            roots = _indexed_roots(conn)
+            if not roots:
+                return
+            touched = set()
+            with conn:
+                for path in removed + [source for source, _ in moved]:
+                    path = os.path.abspath(path)
+                    root = _containing_root(path, roots)
+                    if root is None or not _storable(path):
+                        continue
+                    prefix = path.rstrip(os.sep) + os.sep
+                    _delete_rows(conn, "root = ? AND (path = ? OR (path >= ? AND path < ?))",
+                                 (root, path, prefix, prefix + "\U0010ffff"))
+                    touched.add(root)
+                for _, destination in moved:
+                    destination = os.path.abspath(destination)
+                    root = _containing_root(destination, roots)
+                    if root is None:
+                        continue
+                    if not _storable(destination):
+                        _skip_unstorable(destination)
+                        continue
+                    try:
+                        st = os.stat(destination, follow_symlinks=False)
+                        size, mtime = st.st_size, st.st_mtime
+                    except OSError:
+                        size, mtime = None, None
+                    name = os.path.basename(destination)
+                    row_id = conn.execute(
+                        "INSERT INTO files (root, name, name_lower, path, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                        (root, name, name.lower(), destination, size, mtime)).lastrowid
+                    if _has_trigrams:
+                        conn.execute("INSERT INTO names (rowid, name_lower) VALUES (?, ?)", (row_id, name.lower()))
+                    touched.add(root)
+                for root in touched:
+                    conn.execute("UPDATE roots SET file_count = (SELECT count(*) FROM files WHERE root = ?) "
+                                 "WHERE root = ?", (root, root))
+        except sqlite3.Error as e:
+            log_action(f"❌ Error updating the search index: {e}")
+        finally:
+            conn.close()
@@ -0,0 +1,177 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from locks import path_locks
+from logger import log_action
+
+MAX_WORKERS = 4
+# Number of finished jobs kept so the UI can still read their result
+MAX_FINISHED_JOBS = 100
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+_jobs = {}
+_jobs_lock = threading.Lock()
+_ids = itertools.count(1)
+
+class Job:
+    """
+    A long-running operation executed on the worker pool.
+
+    The job is passed to the operation as its progress argument. Operations
+    call advance() as they scan files and read bytes, and poll cancelled()
+    between items so a cancel request stops them at the next safe point.
+    """
+
+    def __init__(self, name):
+        self.id = f"{int(time.time())}-{next(_ids)}"
+        self.name = name
+        self.status = "queued"
+        self.result = None
+        self.message = ""
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files_scanned = 0
+        self.files_total = None
+        self.bytes_processed = 0
+        self.bytes_total = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._path_lock = None
+
+    def advance(self, files=0, bytes=0):
+        """Adds to the progress counters."""
+        with self._lock:
+            self.files_scanned += files
+            self.bytes_processed += bytes
+
+    def set_total(self, files=None, bytes=None):
+        """Sets the expected totals once they are known so an ETA can be given."""
+        with self._lock:
+            if files is not None:
+                self.files_total = files
+            if bytes is not None:
+                self.bytes_total = bytes
+
+    def cancel(self):
+        """Asks the operation to stop at its next check."""
+        self._cancel.set()
+        if self._path_lock is not None and path_locks.withdraw(self._path_lock):
+            # Still waiting for its folders, so it never gets to run
+            self._path_lock = None
+            self.status = "cancelled"
+            self.message = "Cancelled before it started."
+            self.finished_at = time.time()
+
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def eta(self):
+        """Estimated seconds remaining, preferring byte progress over file progress."""
+        if self.status != "running" or not self.started_at:
+            return None
+        elapsed = time.time() - self.started_at
+        for done, total in ((self.bytes_processed, self.bytes_total),
+                            (self.files_scanned, self.files_total)):
+            if total and done:
+                return max(0.0, elapsed * (total - done) / done)
+        return None
+
+    def to_dict(self):
+        with self._lock:
+            eta = self.eta()
+            return {
+                "id": self.id,
+                "name": self.name,
+                "status": self.status,
+                "message": self.message,
+                "result": self.result,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "files_scanned": self.files_scanned,
+                "files_total": self.files_total,
+                "bytes_processed": self.bytes_processed,
+                "bytes_total": self.bytes_total,
+                "eta_seconds": round(eta, 1) if eta is not None else None
+            }
+
+    def _run(self, func, args, kwargs, messages):
+        try:
+            self._execute(func, args, kwargs, messages)
+        finally:
+            if self._path_lock is not None:
+                path_locks.release(self._path_lock)
+
+    def _execute(self, func, args, kwargs, messages):
+        if self.cancelled():
+            self.status = "cancelled"
+            self.message = "Cancelled before it started."
+            self.finished_at = time.time()
+            return
+
+        self.status = "running"
+        self.started_at = time.time()
+        success_msg, failure_msg = messages
+        try:
+            result = func(*args, progress=self, **kwargs)
+            if self.cancelled():
+                self.status = "cancelled"
+                self.message = "Operation cancelled."
+                log_action(f"⚠️ {self.name} cancelled.")
+            elif result is False or result is None:
+                self.status = "failed"
+                self.message = failure_msg
+            else:
+                self.status = "completed"
+                self.message = success_msg(result) if callable(success_msg) else success_msg
+                if result is not True:
+                    self.result = result
+        except Exception as e:
+            self.status = "failed"
+            self.message = str(e)
+            log_action(f"❌ {self.name} failed: {e}")
+        finally:
+            self.finished_at = time.time()
+
+def submit_job(name, func, *args, messages=("Completed.", "Failed."), lock_paths=None, shared=False, **kwargs):
+    """
+    Queues func(*args, progress=job, **kwargs) on the worker pool and returns
+    the Job immediately. messages are the (success, failure) texts reported
+    when func returns a truthy or falsy result; the success text may also be
+    a callable that builds the message from the result.
+
+    With lock_paths the job only enters the pool once it holds a path lock
+    on those folders (exclusive unless shared), so it never occupies a
+    worker while waiting for an overlapping operation to finish.
+    """
+    job = Job(name)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        _prune_finished()
+    if lock_paths is None:
+        _executor.submit(job._run, func, args, kwargs, messages)
+    else:
+        def start(request):
+            job._path_lock = request
+            _executor.submit(job._run, func, args, kwargs, messages)
+
+        job.message = "Waiting for other operations on these folders..."
+        job._path_lock = path_locks.request(lock_paths, exclusive=not shared, on_grant=start)
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def list_jobs():
+    with _jobs_lock:
+        return list(_jobs.values())
+
+def _prune_finished():
+    """Drops the oldest finished jobs beyond MAX_FINISHED_JOBS. Caller holds _jobs_lock."""
+    finished = [job for job in _jobs.values() if job.finished_at is not None]
+    finished.sort(key=lambda job: job.finished_at)
+    for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job.id]
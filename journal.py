@@ -0,0 +1,349 @@
+import itertools
+import json
+import os
+import threading
+import time
+from indexer import update_index
+from logger import log_action
+from transfer import Transfer
+
+JOURNAL_FILE = "history.jsonl"
+# Written by older versions; imported as one operation the first time it is seen
+LEGACY_HISTORY_FILE = "history.json"
+FSYNC_EVERY = 1000
+UNDO_BATCH_SIZE = 256
+# Rewrite the journal keeping only the newest generations once it gets this big
+COMPACT_BYTES = 64 * 1024 * 1024
+MAX_GENERATIONS = 20
+# How long a file put back by undo is left alone by watch mode
+RESTORED_GRACE_SECONDS = 300
+
+
+_append_lock = threading.Lock()
+# Operations currently holding the journal open; compaction waits until none are
+_active = set()
+_ids = itertools.count(1)
+# Paths undo put back -> when, so a watch on their folder does not organize them again
+_restored = {}
+_restored_lock = threading.Lock()
+
+def _append(records, sync=False):
+    """Appends records as JSON lines in a single write."""
+    data = "".join(json.dumps(record) + "\n" for record in records)
+    with _append_lock:
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+
+class Operation:
+    """
+    Write-ahead journal of one organize run.
+
+    Every move is appended to the journal as soon as it has happened, so a
+    crash mid-run still leaves everything done so far undoable. Nothing is
+    written for runs that end up moving no files.
+    """
+
+    def __init__(self, root, method):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_ids)}"
+        self.root = root
+        self.method = method
+        self.moves = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, source, destination):
+        line = json.dumps({"op": self.id, "src": source, "dst": destination}) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._begin()
+            with _append_lock:
+                self._file.write(line)
+                self._file.flush()
+            self.moves += 1
+            if self.moves % FSYNC_EVERY == 0:
+                os.fsync(self._file.fileno())
+
+    def _begin(self):
+        begin = {"op": self.id, "type": "begin", "root": self.root, "method": self.method, "time": time.time()}
+        with _append_lock:
+            if not _active and os.path.exists(JOURNAL_FILE) and os.path.getsize(JOURNAL_FILE) > COMPACT_BYTES:
+                _compact()
+            _active.add(self.id)
+            self._file = open(JOURNAL_FILE, "a", encoding="utf-8")
+            self._file.write(json.dumps(begin) + "\n")
+            self._file.flush()
+
+    def close(self):
+        """Marks the operation complete and syncs it to disk."""
+        with self._lock:
+            if self._file is None:
+                return
+            with _append_lock:
+                self._file.write(json.dumps({"op": self.id, "type": "end", "moves": self.moves}) + "\n")
+                self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            with _append_lock:
+                _active.discard(self.id)
+        log_action("History saved for potential undo.")
+
+def begin_operation(root, method):
+    # Older history must land in the journal before anything newer
+    _migrate_legacy_history()
+    return Operation(root, method)
+
+def _read_reversed(path, block_size=65536):
+    """Yields the journal's records from last to first, reading it in blocks from the end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + tail).split(b"\n")
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                record = _parse(line)
+                if record is not None:
+                    yield record
+        record = _parse(tail)
+        if record is not None:
+            yield record
+
+def _read_forward(path):
+    with open(path, "rb") as f:
+        for line in f:
+            record = _parse(line)
+            if record is not None:
+                yield record
+
+def _parse(line):
+    # A crash can leave a torn last line behind; it is simply ignored
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _migrate_legacy_history():
+    """Imports a history.json written by older versions as one operation."""
+    if not os.path.exists(LEGACY_HISTORY_FILE):
+        return
+    try:
+        with open(LEGACY_HISTORY_FILE, "r", encoding="utf-8") as f:
+            history = json.load(f)
+        operation = Operation(None, "legacy")
+        for entry in history:
+            if entry.get("source") and entry.get("destination"):
+                operation.record(entry["source"], entry["destination"])
+        operation.close()
+        os.remove(LEGACY_HISTORY_FILE)
+    except Exception as e:
+        log_action(f"Error loading history: {e}")
+
+def list_operations():
+    """Returns a summary of every journaled operation, newest first."""
+    _migrate_legacy_history()
+    if not os.path.exists(JOURNAL_FILE):
+        return []
+
+    operations = {}
+    for record in _read_forward(JOURNAL_FILE):
+        op = operations.setdefault(record["op"], {
+            "id": record["op"], "root": None, "method": None, "time": None,
+            "moves": 0, "complete": False, "undone": False
+        })
+        kind = record.get("type")
+        if kind == "begin":
+            op.update(root=record.get("root"), method=record.get("method"), time=record.get("time"))
+        elif kind == "end":
+            op["complete"] = True
+        elif kind == "undone":
+            op["undone"] = True
+        elif kind is None:
+            op["moves"] += 1
+    return sorted(operations.values(), key=lambda op: op["time"] or 0, reverse=True)
+
+def _mark_restored(paths):
+    now = time.monotonic()
+    with _restored_lock:
+        for path, when in list(_restored.items()):
+            if now - when > RESTORED_GRACE_SECONDS:
+                del _restored[path]
+        for path in paths:
+            _restored[os.path.abspath(path)] = now
+
+def take_restored(path):
+    """
+    Returns True (once) if undo put path back in the last
+    RESTORED_GRACE_SECONDS, so watch mode can leave it where it is.
+    """
+    with _restored_lock:
+        when = _restored.pop(os.path.abspath(path), None)
+    return when is not None and time.monotonic() - when <= RESTORED_GRACE_SECONDS
+
+def _restore_batch(batch):
+    """
+    Moves a batch of files back, creating each missing parent directory
+    once, and updates the search index to match.
+    """
+    restored = 0
+    errors = 0
+    done = []
+    for parent in {os.path.dirname(source) for source, destination in batch if os.path.exists(destination)}:
+        try:
+            os.makedirs(parent, exist_ok=True)
+        except OSError as e:
+            log_action(f"Error creating folder {parent}: {e}")
+
+    across = []
+    for source, destination in batch:
+        try:
+            os.rename(destination, source)
+        except FileNotFoundError:
+            if os.path.exists(source):
+                # Restored by an earlier, interrupted undo
+                continue
+            log_action(f"Warning: File not found at destination: {destination}")
+            errors += 1
+            continue
+        except OSError:
+            # Most likely on another device; copied back below
+            across.append((destination, source))
+            continue
+        log_action(f"Restored: {os.path.basename(source)}")
+        done.append((destination, source))
+        restored += 1
+
+    if across:
+        with Transfer() as transfer:
+            for (destination, source), error, _ in transfer.move_many(across):
+                if error is not None:
+                    log_action(f"Error restoring {destination}: {error}")
+                    errors += 1
+                    continue
+                log_action(f"Restored: {os.path.basename(source)}")
+                done.append((destination, source))
+                restored += 1
+            transfer.report()
+    _mark_restored(source for _, source in done)
+    update_index(moved=done)
+    return restored, errors
+
+def find_undo_target(operation_id=None, exclude=()):
+    """
+    Returns (operation ID, root) of the operation undo_operation would undo
+    (the given one, or the newest not undone and not in exclude), or None
+    if there is none. root is None for operations imported from the legacy
+    history file.
+    """
+    _migrate_legacy_history()
+    if not os.path.exists(JOURNAL_FILE):
+        return None
+
+    undone = set()
+    target = operation_id
+    for record in _read_reversed(JOURNAL_FILE):
+        op = record["op"]
+        kind = record.get("type")
+        if kind == "undone":
+            undone.add(op)
+            continue
+        if target is None and kind in (None, "end") and op not in undone and op not in exclude:
+            target = op
+        if op == target and kind == "begin":
+            return None if op in undone else (op, record.get("root"))
+    return None
+
+def undo_operation(operation_id=None, progress=None):
+    """
+    Undoes one journaled operation, by default the newest one not yet undone.
+
+    The journal is streamed backwards so moves are reverted newest first in
+    constant memory, UNDO_BATCH_SIZE renames at a time. Returns None when
+    there is nothing to undo, otherwise (files_restored, errors, cancelled).
+    """
+    _migrate_legacy_history()
+    if not os.path.exists(JOURNAL_FILE):
+        return None
+
+    undone = set()
+    target = operation_id
+    # An unknown operation ID matches no record and must not be marked undone
+    seen = False
+    files_restored = 0
+    errors = 0
+    batch = []
+
+    for record in _read_reversed(JOURNAL_FILE):
+        op = record["op"]
+        kind = record.get("type")
+        if kind == "undone":
+            undone.add(op)
+            continue
+        if target is None and kind in (None, "end") and op not in undone:
+            target = op
+        if op != target:
+            continue
+        if op in undone:
+            return None
+        seen = True
+        if kind == "end" and progress is not None:
+            progress.set_total(files=record.get("moves"))
+        if kind == "begin":
+            break
+        if kind is not None:
+            continue
+
+        if progress is not None:
+            if progress.cancelled():
+                # No undone marker, so running undo again resumes where this stopped
+                restored, failed = _restore_batch(batch)
+                return files_restored + restored, errors + failed, True
+            progress.advance(files=1)
+
+        batch.append((record["src"], record["dst"]))
+        if len(batch) >= UNDO_BATCH_SIZE:
+            restored, failed = _restore_batch(batch)
+            files_restored += restored
+            errors += failed
+            batch = []
+
+    if not seen:
+        return None
+
+    restored, failed = _restore_batch(batch)
+    files_restored += restored
+    errors += failed
+    _append([{"op": target, "type": "undone", "time": time.time()}], sync=True)
+    return files_restored, errors, False
+
+def _compact(keep=MAX_GENERATIONS):
+    """
+    Rewrites the journal keeping only the newest keep operations that are
+    still undoable. Caller holds _append_lock and no operation is open.
+    """
+    order = []
+    undone = set()
+    for record in _read_forward(JOURNAL_FILE):
+        if record.get("type") == "begin":
+            order.append(record["op"])
+        elif record.get("type") == "undone":
+            undone.add(record["op"])
+    kept = set([op for op in order if op not in undone][-keep:])
+
+    temp_file = JOURNAL_FILE + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as out:
+        for record in _read_forward(JOURNAL_FILE):
+            if record["op"] in kept:
+                out.write(json.dumps(record) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp_file, JOURNAL_FILE)
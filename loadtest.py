@@ -0,0 +1,324 @@
+"""
+HTTP load test for the web server: how request latency holds up while
+long jobs run and several browser tabs poll it.
+
+A synthetic tree (see benchmark.TreeSpec) is generated and a mix of
+clients runs against it for a fixed time:
+
+  pollers   fetch /api/logs?since=N and /api/jobs every --poll-interval
+            seconds, like an open tab of the UI
+  queriers  run /api/search and /api/storage back to back, with --think
+            seconds between requests
+  jobs      start duplicate, empty folder and pipeline previews one after
+            another and follow each through /api/jobs/<id> until it ends
+
+Only previews are started, so the tree is never changed and every run
+does the same work. p50/p95/p99 latency, errors and requests per second
+are reported per endpoint and written as JSON; --compare prints the p95
+of each endpoint against an earlier result file, and --max-p95 makes the
+exit status 1 when any endpoint is slower than that.
+
+    python3 loadtest.py --spawn --duration 30 --pollers 8 --queriers 2
+    python3 loadtest.py --url http://127.0.0.1:5001 --output after.json --compare before.json
+
+With --url the server must run on this machine, since it is sent the
+path of the generated tree. --spawn starts app.py's Flask app on a free
+port instead, in a scratch working directory so its journal, caches and
+log file are thrown away afterwards.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from benchmark import TreeSpec, _git_commit, generate_tree
+
+DEFAULT_URL = "http://127.0.0.1:5001"
+# Seconds before a request counts as failed
+REQUEST_TIMEOUT = 60
+# Seconds to wait for a spawned server to answer
+STARTUP_TIMEOUT = 30
+PERCENTILES = (50, 95, 99)
+# Previews the job clients cycle through; none of them change the tree
+JOB_REQUESTS = (
+    ("/api/clean/duplicates", {"dry_run": True}),
+    ("/api/clean/empty_folders", {"dry_run": True}),
+    ("/api/pipeline", {"dry_run": True})
+)
+FINISHED = {"completed", "failed", "cancelled"}
+
+def _percentile(ordered, percent):
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[min(rank, len(ordered)) - 1]
+
+class Recorder:
+    """Latency samples per endpoint, shared by every client thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        with self._lock:
+            samples = {endpoint: sorted(runs) for endpoint, runs in self.samples.items()}
+            errors = dict(self.errors)
+        results = {}
+        for endpoint, runs in sorted(samples.items()):
+            result = {"requests": len(runs), "errors": errors.get(endpoint, 0),
+                      "per_second": round(len(runs) / duration, 2),
+                      "mean": round(sum(runs) / len(runs), 6)}
+            for percent in PERCENTILES:
+                result[f"p{percent}"] = round(_percentile(runs, percent), 6)
+            result["max"] = round(runs[-1], 6)
+            results[endpoint] = result
+        return results
+
+class Client:
+    """One simulated user: sends requests until the shared stop event is set."""
+
+    def __init__(self, base_url, root, recorder, stop):
+        self.base_url = base_url.rstrip("/")
+        self.root = root
+        self.recorder = recorder
+        self.stop = stop
+
+    def request(self, method, path, payload=None, endpoint=None):
+        """
+        Sends one request and records its latency (until the whole body has
+        arrived) under endpoint, which defaults to "METHOD path". Returns
+        the decoded JSON answer, or None if the request failed.
+        """
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {} if data is None else {"Content-Type": "application/json"}
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                body = response.read()
+            ok = True
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            ok = False
+        except OSError:
+            body = None
+            ok = False
+        self.recorder.add(endpoint or f"{method} {path.split('?')[0]}", time.perf_counter() - start, ok)
+        if not ok or not body:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def poll(self, interval):
+        """Polls the log and job list like an open browser tab."""
+        last_seq = None
+        while not self.stop.is_set():
+            start = time.monotonic()
+            path = "/api/logs" if last_seq is None else f"/api/logs?since={last_seq}"
+            answer = self.request("GET", path)
+            if answer is not None:
+                last_seq = answer.get("last_seq", last_seq)
+            self.request("GET", "/api/jobs")
+            self.stop.wait(max(0.0, interval - (time.monotonic() - start)))
+
+    def query(self, think, search):
+        """Alternates searches and storage totals."""
+        while not self.stop.is_set():
+            self.request("POST", "/api/search", {"path": self.root, "query": search})
+            if self.stop.wait(think):
+                return
+            self.request("POST", "/api/storage", {"path": self.root})
+            self.stop.wait(think)
+
+    def run_jobs(self, interval, durations):
+        """Starts one preview after another and follows each to the end."""
+        turn = 0
+        while not self.stop.is_set():
+            path, payload = JOB_REQUESTS[turn % len(JOB_REQUESTS)]
+            turn += 1
+            start = time.perf_counter()
+            answer = self.request("POST", path, {"path": self.root, **payload})
+            job_id = answer.get("job_id") if answer else None
+            if job_id is None:
+                self.stop.wait(interval)
+                continue
+            while not self.stop.wait(interval):
+                answer = self.request("GET", f"/api/jobs/{job_id}", endpoint="GET /api/jobs/<id>")
+                job = answer.get("job") if answer else None
+                if job is not None and job.get("status") in FINISHED:
+                    # The server's own timestamps leave out the polling delay
+                    if job.get("finished_at") and job.get("created_at"):
+                        elapsed = job["finished_at"] - job["created_at"]
+                    else:
+                        elapsed = time.perf_counter() - start
+                    durations.add(f"job {path}", elapsed, job["status"] == "completed")
+                    break
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def spawn_server(workdir):
+    """Starts the Flask app in a child process and returns (process, base URL) once it answers."""
+    port = _free_port()
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")])))
+    code = f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode} (is Flask installed?)")
+        try:
+            with urllib.request.urlopen(base_url + "/api/jobs", timeout=1):
+                return process, base_url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"server did not answer within {STARTUP_TIMEOUT} seconds")
+
+def run_load(base_url, root, duration, pollers=4, queriers=2, jobs=1, poll_interval=1.0, think=0.1,
+             search="file00"):
+    """Runs the client mix against base_url for duration seconds and returns the per-endpoint summaries."""
+    recorder = Recorder()
+    durations = Recorder()
+    stop = threading.Event()
+    threads = []
+    for count, target, args in ((pollers, Client.poll, (poll_interval,)),
+                                (queriers, Client.query, (think, search)),
+                                (jobs, Client.run_jobs, (poll_interval / 4, durations))):
+        for _ in range(count):
+            client = Client(base_url, root, recorder, stop)
+            threads.append(threading.Thread(target=target, args=(client, *args), daemon=True))
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        stop.wait(duration)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    return recorder.summary(elapsed), durations.summary(elapsed), elapsed
+
+def print_summary(endpoints, jobs):
+    print(f"\n{'endpoint':<34}{'reqs':>7}{'err':>5}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for endpoint, result in list(endpoints.items()) + list(jobs.items()):
+        print(f"{endpoint:<34}{result['requests']:>7}{result['errors']:>5}{result['per_second']:>8.1f}"
+              + "".join(f"{result[key]:>9.3f}" for key in ("p50", "p95", "p99", "max")))
+
+def compare(current, baseline):
+    """Prints each endpoint's p95 next to the baseline's, with the ratio."""
+    print(f"\n{'endpoint':<34}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for endpoint, result in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if before is None:
+            print(f"{endpoint:<34}{'-':>12}{result['p95']:>12.4f}{'-':>8}")
+            continue
+        ratio = result["p95"] / before["p95"] if before["p95"] else float("inf")
+        print(f"{endpoint:<34}{before['p95']:>12.4f}{result['p95']:>12.4f}{ratio:>8.2f}")
+    if baseline.get("tree") != current["tree"] or baseline.get("clients") != current["clients"]:
+        print("⚠️ The baseline was run with a different tree or client mix.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the File Organizer Pro web server.")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=DEFAULT_URL, help=f"server to test (default: {DEFAULT_URL})")
+    target.add_argument("--spawn", action="store_true", help="start the server on a free port for the run")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load (default: 30)")
+    parser.add_argument("--pollers", type=int, default=4, help="clients polling logs and jobs (default: 4)")
+    parser.add_argument("--queriers", type=int, default=2, help="clients running searches and storage (default: 2)")
+    parser.add_argument("--jobs", type=int, default=1, help="clients running previews back to back (default: 1)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between polls (default: 1)")
+    parser.add_argument("--think", type=float, default=0.1, help="seconds between a querier's requests")
+    parser.add_argument("--search", default="file00", help="query the queriers search for")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="loadtest_results.json")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--max-p95", type=float, help="exit with status 1 if any endpoint's p95 exceeds this")
+    args = parser.parse_args(argv)
+
+    spec = TreeSpec(files=args.files, depth=args.depth, fanout=args.fanout, seed=args.seed)
+    clients = {"pollers": args.pollers, "queriers": args.queriers, "jobs": args.jobs,
+               "poll_interval": args.poll_interval, "think": args.think}
+    workdir = tempfile.mkdtemp(prefix="organizer-load-")
+    server = None
+    try:
+        root = os.path.join(workdir, "tree")
+        generate_tree(root, spec)
+        base_url = args.url
+        if args.spawn:
+            try:
+                server, base_url = spawn_server(workdir)
+            except RuntimeError as e:
+                print(f"❌ Could not start the server: {e}")
+                return 1
+        print(f"Loading {base_url} for {args.duration:g}s: {args.pollers} pollers, "
+              f"{args.queriers} queriers, {args.jobs} job clients")
+        endpoints, jobs, elapsed = run_load(base_url, root, args.duration, args.pollers, args.queriers, args.jobs,
+                                            args.poll_interval, args.think, args.search)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "commit": _git_commit(),
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "duration": round(elapsed, 3),
+        "clients": clients,
+        "tree": spec.to_dict(),
+        "endpoints": endpoints,
+        "jobs": jobs
+    }
+    print_summary(endpoints, jobs)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+    if args.jobs > 0 and not jobs:
+        print("❌ No preview job finished during the run; check that /api/jobs/<id> still reports status.")
+        return 1
+
+    if args.max_p95 is not None:
+        slow = [endpoint for endpoint, result in endpoints.items() if result["p95"] > args.max_p95]
+        if slow:
+            print(f"❌ p95 above {args.max_p95}s: {', '.join(slow)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
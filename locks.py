@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+def _normalize(path):
+    path = os.path.normcase(os.path.realpath(os.path.abspath(path)))
+    # The prefix every path below this one starts with
+    return path if path.endswith(os.sep) else path + os.sep
+
+class LockRequest:
+    """One operation's claim on a set of folder trees."""
+
+    def __init__(self, paths, exclusive, on_grant):
+        self.prefixes = [_normalize(path) for path in paths]
+        self.exclusive = exclusive
+        self.on_grant = on_grant
+        self.granted = False
+
+    def conflicts(self, other):
+        """Two claims conflict when any of their trees overlap and either one writes."""
+        if not (self.exclusive or other.exclusive):
+            return False
+        return any(a.startswith(b) or b.startswith(a) for a in self.prefixes for b in other.prefixes)
+
+class PathLocks:
+    """
+    Hierarchical reader/writer locks on folder trees.
+
+    A lock on a folder covers everything below it, so operations on
+    disjoint trees run side by side while overlapping ones wait their
+    turn. Any number of shared (read) locks on a tree can be held at once;
+    an exclusive (write) lock excludes every other lock on an overlapping
+    tree. Waiting requests are granted in arrival order among those that
+    overlap, so a stream of readers cannot starve a writer, but a request
+    never waits behind one on an unrelated tree.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = []
+        self._waiting = deque()
+
+    def request(self, paths, exclusive=True, on_grant=None):
+        """
+        Asks for a lock without blocking. on_grant(request) is called (from
+        the releasing thread, or before this returns) once it is granted;
+        the caller must release() the request afterwards.
+        """
+        request = LockRequest(paths, exclusive, on_grant)
+        with self._lock:
+            self._waiting.append(request)
+            granted = self._grant()
+        self._notify(granted)
+        return request
+
+    def release(self, request):
+        with self._lock:
+            self._held.remove(request)
+            granted = self._grant()
+        self._notify(granted)
+
+    def withdraw(self, request):
+        """Drops a request that has not been granted yet. Returns False if it already was."""
+        with self._lock:
+            if request.granted:
+                return False
+            self._waiting.remove(request)
+            granted = self._grant()
+        self._notify(granted)
+        return True
+
+    def _grant(self):
+        """Grants every waiting request that conflicts with nothing held or queued ahead of it."""
+        granted = []
+        ahead = []
+        for request in list(self._waiting):
+            if any(request.conflicts(other) for other in self._held) or \
+                    any(request.conflicts(other) for other in ahead):
+                ahead.append(request)
+                continue
+            self._waiting.remove(request)
+            self._held.append(request)
+            request.granted = True
+            granted.append(request)
+        return granted
+
+    def _notify(self, granted):
+        for request in granted:
+            if request.on_grant is not None:
+                request.on_grant(request)
+
+    @contextmanager
+    def hold(self, paths, exclusive=False):
+        """Blocks until the lock is granted and holds it for the with block."""
+        ready = threading.Event()
+        request = self.request(paths, exclusive, lambda _: ready.set())
+        ready.wait()
+        try:
+            yield
+        finally:
+            self.release(request)
+
+    def snapshot(self):
+        """The held and waiting locks, for status pages."""
+        with self._lock:
+            def describe(request):
+                return {"paths": [prefix.rstrip(os.sep) or os.sep for prefix in request.prefixes],
+                        "exclusive": request.exclusive}
+            return {"held": [describe(r) for r in self._held], "waiting": [describe(r) for r in self._waiting]}
+
+# Shared by the web server, the job engine and watch mode
+path_locks = PathLocks()
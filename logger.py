@@ -1,21 +1,119 @@
+import atexit
 import datetime
+import queue
+import sys
+import threading
 from collections import deque
 
-# Keep the last 100 log messages in memory for the web UI
+LOG_FILE = "file_organizer.log"
+# Upper bound on messages written per batch so one flush never stalls for long
+MAX_BATCH = 1000
+
+# Keep the last 100 log records (sequence number, message) in memory for the web UI
 log_buffer = deque(maxlen=100)
+_last_seq = 0
+_buffer_cond = threading.Condition()
+
+# Messages waiting for the background writer
+_write_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+# Stands for whatever sys.stdout is at write time, so redirect_stdout still applies
+_STDOUT = object()
+# Where log lines are echoed besides the log file; None keeps them off the console
+_console = _STDOUT
+# Called with every formatted message, from the thread that logged it
+_callback = None
+
+def _write_loop():
+    """Writes queued messages to the log file and console in batches."""
+    with open(LOG_FILE, "a", encoding="utf-8") as log:
+        while True:
+            batch = [_write_queue.get()]
+            try:
+                while len(batch) < MAX_BATCH:
+                    batch.append(_write_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            text = "\n".join(batch) + "\n"
+            try:
+                log.write(text)
+                log.flush()
+                console = sys.stdout if _console is _STDOUT else _console
+                if console is not None:
+                    console.write(text)
+                    console.flush()
+            except Exception:
+                # Logging must never take the application down
+                pass
+            finally:
+                for _ in batch:
+                    _write_queue.task_done()
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+                _writer.start()
+
+def set_console(stream):
+    """Echoes log lines to stream instead of stdout (None to silence them)."""
+    global _console
+    _console = stream
+
+def set_log_callback(callback):
+    """
+    Registers callback(message) to receive every log line (None removes it).
+    It runs on whichever thread logged, so it must be quick and thread-safe,
+    e.g. a queue's put.
+    """
+    global _callback
+    _callback = callback
 
 def log_action(message):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     formatted_msg = f"{timestamp} - {message}"
-    
-    # Save to file
-    with open("file_organizer.log", "a", encoding="utf-8") as log:
-        log.write(f"{formatted_msg}\n")
-    
-    # Save to memory buffer for frontend
-    log_buffer.append(formatted_msg)
-    
-    print(formatted_msg)
+
+    # Save to memory buffer for frontend, numbered so clients can fetch only new records
+    global _last_seq
+    with _buffer_cond:
+        _last_seq += 1
+        log_buffer.append((_last_seq, formatted_msg))
+        _buffer_cond.notify_all()
+
+    callback = _callback
+    if callback is not None:
+        callback(formatted_msg)
+
+    # File and console output happen on the background writer
+    _ensure_writer()
+    _write_queue.put(formatted_msg)
+
+def flush_logs():
+    """Blocks until every queued message has been written to disk."""
+    if _writer is not None:
+        _write_queue.join()
+
+atexit.register(flush_logs)
 
 def get_recent_logs():
-    return list(log_buffer)
+    with _buffer_cond:
+        return [msg for _, msg in log_buffer]
+
+def get_logs_since(since=0):
+    """Returns the buffered (seq, message) records newer than since."""
+    with _buffer_cond:
+        return [record for record in log_buffer if record[0] > since]
+
+def get_last_seq():
+    with _buffer_cond:
+        return _last_seq
+
+def wait_for_logs(since, timeout=None):
+    """Waits up to timeout seconds for records newer than since and returns them."""
+    with _buffer_cond:
+        _buffer_cond.wait_for(lambda: _last_seq > since, timeout=timeout)
+        return [record for record in log_buffer if record[0] > since]
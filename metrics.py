@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; covers quick API calls as well as organizing a large tree
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """A named family of values, one per combination of label values."""
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _samples(self):
+        """Yields (suffix, label values, extra labels, value) for render()."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            yield "", key, (), value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One slot per bucket plus +Inf, then the running sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+        for key, counts in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_value(float(bound))),), cumulative
+            yield "_sum", key, (), counts[-1]
+            yield "_count", key, (), cumulative
+
+def render():
+    """Returns every registered metric in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+OPERATION_DURATION = Histogram(
+    "organizer_operation_duration_seconds", "Wall time of file operations.", ["operation"])
+OPERATIONS = Counter(
+    "organizer_operations_total", "File operations run, by outcome.", ["operation", "status"])
+FILES_PROCESSED = Counter(
+    "organizer_files_processed_total", "Files (or folders) handled by file operations.", ["operation"])
+FILES_PER_SECOND = Gauge(
+    "organizer_operation_files_per_second", "Throughput of the last completed run of each operation.", ["operation"])
+BYTES_HASHED = Counter(
+    "organizer_bytes_hashed_total", "File content bytes read for hashing.")
+HASH_THROUGHPUT = Gauge(
+    "organizer_hash_throughput_mb_per_second", "Hashing throughput of the last duplicate scan.", ["algorithm"])
+BYTES_TRANSFERRED = Counter(
+    "organizer_bytes_transferred_total", "File bytes copied by moves across devices.")
+TRANSFER_THROUGHPUT = Gauge(
+    "organizer_transfer_throughput_mb_per_second", "Copy throughput of the last run that moved files across devices.")
+CACHE_HITS = Counter(
+    "organizer_cache_hits_total", "Lookups answered from a cache instead of the disk.", ["cache"])
+CACHE_MISSES = Counter(
+    "organizer_cache_misses_total", "Lookups a cache could not answer.", ["cache"])
+REQUEST_LATENCY = Histogram(
+    "organizer_http_request_duration_seconds", "API request latency.", ["endpoint", "method", "status"])
+
+class _Run:
+    def __init__(self):
+        self.files = 0
+        # Set by callers that give up without raising, so the run counts as an error
+        self.failed = False
+
+@contextmanager
+def track_operation(operation):
+    """
+    Times the enclosed operation. The caller adds the number of items it
+    handled to the yielded object's files attribute; an exception, or
+    setting its failed attribute, counts the run as an error.
+    """
+    run = _Run()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield run
+        status = "error" if run.failed else "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        OPERATION_DURATION.observe(elapsed, operation=operation)
+        OPERATIONS.inc(operation=operation, status=status)
+        FILES_PROCESSED.inc(run.files, operation=operation)
+        if status == "ok" and elapsed > 0:
+            FILES_PER_SECOND.set(round(run.files / elapsed, 1), operation=operation)
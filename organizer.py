@@ -1,79 +1,161 @@
 import os
-import shutil
 import time
-from config import FILE_TYPES
 from logger import log_action
-from features import save_history
+from indexer import update_index
+from journal import begin_operation
+from metrics import track_operation
+from rules import get_ruleset
+from transfer import TRANSFER_WORKERS, Transfer
 
-def organize_files(path, method="type"):
+def plan_organization(path, method="type"):
     """
-    method: "type" or "date"
+    Builds the complete list of moves for organize_files without touching
+    any file. method names a rule set from rules.py ("type", "date" or one
+    defined in the rules file). Returns a list of (source, destination,
+    folder) tuples.
     """
-    if not os.path.exists(path):
-        log_action("❌ Path does not exist")
-        return False
+    with os.scandir(path) as it:
+        return plan_entries(path, it, method)
 
-    history = []
-
-    for item in os.listdir(path):
-        item_path = os.path.join(path, item)
+def plan_entries(path, entries, method="type"):
+    """plan_organization for DirEntries of path that were already listed."""
+    ruleset = get_ruleset(method)
+    if ruleset is None:
+        log_action(f"❌ Unknown organization method: {method}")
+        return []
 
+    moves = []
+    now = time.time()
+    for entry in entries:
         # Skip directories
-        if os.path.isdir(item_path):
+        if entry.is_dir():
+            continue
+
+        folder = ruleset.destination(entry, now)
+        if folder is None:
             continue
 
-        moved = False
-        destination_path = ""
-        
-        if method == "type":
-            _, ext = os.path.splitext(item)
-            ext = ext.lower()
-
-            for folder, extensions in FILE_TYPES.items():
-                if ext in extensions:
-                    folder_path = os.path.join(path, folder)
-                    os.makedirs(folder_path, exist_ok=True)
-                    
-                    destination_path = os.path.join(folder_path, item)
-                    shutil.move(item_path, destination_path)
-                    log_action(f"Moved {item} to {folder}")
-                    moved = True
-                    break
-
-            if not moved:
-                other_path = os.path.join(path, "Others")
-                os.makedirs(other_path, exist_ok=True)
-                destination_path = os.path.join(other_path, item)
-                shutil.move(item_path, destination_path)
-                log_action(f"Moved {item} to Others")
-                moved = True
-                
-        elif method == "date":
-            # Organize by creation/modification year and month
-            stat = os.stat(item_path)
-            # Use modification time (mtime) as it's more reliable across OSes
-            file_time = time.localtime(stat.st_mtime)
-            year_month = time.strftime("%Y-%m", file_time)
-            
-            folder_path = os.path.join(path, year_month)
+        destination = os.path.normpath(os.path.join(path, folder, entry.name))
+        if destination == os.path.normpath(entry.path):
+            # Already where the rule would put it
+            continue
+        moves.append((entry.path, destination, folder))
+    return moves
+
+def summarize_plan(moves, limit=1000):
+    """Dry-run preview: file counts per folder and the first moves of the plan."""
+    folders = {}
+    for _, _, folder in moves:
+        folders[folder] = folders.get(folder, 0) + 1
+    return {
+        "total": len(moves),
+        "folders": folders,
+        "moves": [{"source": source, "destination": destination} for source, destination, _ in moves[:limit]]
+    }
+
+def execute_plan(path, moves, journal, progress=None, workers=TRANSFER_WORKERS):
+    """
+    Carries out a plan from plan_organization, appending each completed move
+    to the undo journal as it happens, and returns the number of files moved.
+    Each target folder is created once up front; moves on the same device as
+    path are atomic renames done in order, the rest are copied several at a
+    time by a transfer.Transfer. The search index is updated with the
+    files that moved.
+    """
+    root_dev = os.stat(path).st_dev
+    folder_devs = {}
+    for folder in {folder for _, _, folder in moves}:
+        folder_path = os.path.join(path, folder)
+        try:
             os.makedirs(folder_path, exist_ok=True)
-            
-            destination_path = os.path.join(folder_path, item)
-            shutil.move(item_path, destination_path)
-            log_action(f"Moved {item} to {year_month}")
-            moved = True
-            
-        if moved:
-            history.append({
-                "source": item_path,
-                "destination": destination_path
-            })
-
-    if history:
-        save_history(history)
-        
-    log_action("✅ Files organized successfully!")
-    return True
+            folder_devs[folder] = os.stat(folder_path).st_dev
+        except OSError as e:
+            log_action(f"Error creating folder {folder_path}: {e}")
+
+    moved = 0
+    done = []
+    cross_device = []
+    if progress is not None:
+        progress.set_total(files=len(moves))
+
+    for source, destination, folder in moves:
+        if folder not in folder_devs:
+            continue
+        if folder_devs[folder] != root_dev:
+            cross_device.append((source, destination, folder))
+            continue
+        if progress is not None:
+            if progress.cancelled():
+                log_action("⚠️ Organization cancelled, keeping history of files already moved.")
+                update_index(moved=done)
+                return moved
+            progress.advance(files=1)
+        try:
+            os.rename(source, destination)
+            journal.record(source, destination)
+            log_action(f"Moved {os.path.basename(source)} to {folder}")
+            done.append((source, destination))
+            moved += 1
+        except OSError as e:
+            log_action(f"Error moving {source}: {e}")
+
+    if cross_device:
+        folders = {destination: folder for _, destination, folder in cross_device}
+        # Journaled from the worker, the moment each file has arrived
+        with Transfer(workers, progress=progress, on_moved=journal.record) as transfer:
+            pairs = ((source, destination) for source, destination, _ in cross_device)
+            for (source, destination), error, skipped in transfer.move_many(pairs):
+                if skipped:
+                    continue
+                if progress is not None:
+                    progress.advance(files=1)
+                if error is not None:
+                    log_action(f"Error moving {source}: {error}")
+                    continue
+                log_action(f"Moved {os.path.basename(source)} to {folders[destination]}")
+                done.append((source, destination))
+                moved += 1
+            transfer.report()
+        if progress is not None and progress.cancelled():
+            log_action("⚠️ Organization cancelled, keeping history of files already moved.")
+
+    update_index(moved=done)
+    return moved
+
+def organize_files(path, method="type", progress=None, dry_run=False):
+    """
+    method: "type", "date" or the name of a rule set from the rules file
+    progress: optional jobs.Job that receives per-file progress and can cancel the run
+    dry_run: only build the plan and return a summary of it
+    """
+    with track_operation("organize_preview" if dry_run else "organize") as run:
+        if not os.path.exists(path):
+            log_action("❌ Path does not exist")
+            run.failed = True
+            return None if dry_run else False
+        if get_ruleset(method) is None:
+            log_action(f"❌ Unknown organization method: {method}")
+            run.failed = True
+            return None if dry_run else False
+
+        moves = plan_organization(path, method)
+        run.files = len(moves)
+
+        if dry_run:
+            summary = summarize_plan(moves)
+            for folder, count in sorted(summary["folders"].items()):
+                log_action(f"Would move {count} files to {folder}")
+            log_action(f"✅ Plan ready: {summary['total']} files would be moved.")
+            return summary
+
+        journal = begin_operation(os.path.abspath(path), method)
+        try:
+            run.files = execute_plan(path, moves, journal, progress)
+        finally:
+            journal.close()
+
+        log_action("✅ Files organized successfully!")
+        return True
 
 if __name__ == "__main__":
     print("📂 FILE ORGANIZER")
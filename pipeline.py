@@ -0,0 +1,249 @@
+import os
+from config import HASH_ALGORITHM
+from dup_store import DuplicateStore
+from features import (count_entries, delete_duplicates, duplicate_report, hash_candidates, iter_duplicates,
+                      prune_empty_folders, regular_files)
+from journal import begin_operation
+from logger import log_action
+from metrics import track_operation
+from organizer import execute_plan, plan_entries, summarize_plan
+from rules import get_ruleset
+from scanner import walk
+
+# The maintenance steps a pipeline can run, in any order and each at most once
+STEPS = ("organize", "duplicates", "empty_folders")
+
+class _Recorder:
+    """Journal stand-in that also remembers which moves completed."""
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.moves = []
+
+    def record(self, source, destination):
+        self.journal.record(source, destination)
+        # list.append is atomic, and cross-device moves record from worker threads
+        self.moves.append((source, destination))
+
+class _Pipeline:
+    """
+    The state the steps of one run share: the top-level entries of the
+    root, the duplicate store and the per-folder entry counts of
+    remove_empty_folders, all filled by a single walk. Each step keeps
+    them in line with what it changed, so later steps never list or stat
+    the tree again.
+    """
+
+    def __init__(self, path, steps, method, dry_run, hardlink, algorithm, progress, limit):
+        self.path = path
+        self.steps = steps
+        self.method = method
+        self.dry_run = dry_run
+        self.hardlink = hardlink
+        self.algorithm = algorithm
+        self.progress = progress
+        self.limit = limit
+        self.top = []
+        # dirpath -> [parent, entries left], as in remove_empty_folders
+        self.remaining = {}
+        self.store = DuplicateStore() if "duplicates" in steps else None
+        # Root files wait to be added to the store until organize has moved them
+        self.deferred = []
+        # Where organize moved (or in a dry run, would move) each root file
+        self.moved = {}
+        # The reverse of moved in a dry run, where files are still at their old names
+        self.sources = {}
+        # Root files deleted (or in a dry run, that would be) as duplicates
+        self.gone = set()
+        self.files = 0
+
+    def cancelled(self):
+        return self.progress is not None and self.progress.cancelled()
+
+    def scan(self):
+        """The one traversal. Returns False if cancelled."""
+        defer = "organize" in self.steps
+        # Symlinks to directories are listed too, they keep their folder non-empty
+        for dirpath, dirs, files in walk(self.path, links=True):
+            if self.progress is not None:
+                if self.progress.cancelled():
+                    return False
+                self.progress.advance(files=len(files))
+            self.files += len(files)
+            count_entries(self.remaining, dirpath, dirs, files)
+            at_root = dirpath == self.path
+            if at_root:
+                self.top = files
+            if self.store is not None:
+                for entry, st in regular_files(files):
+                    if at_root and defer:
+                        self.deferred.append((entry.path, st))
+                    else:
+                        self.store.add(entry.path, st)
+        return True
+
+    def _arrive(self, filepath):
+        """Counts a new entry in its folder, creating the folder's record if it did not exist."""
+        folder = os.path.dirname(filepath)
+        record = self.remaining.get(folder)
+        if record is None:
+            self._arrive(folder)
+            record = self.remaining[folder] = [os.path.dirname(folder), 0]
+        record[1] += 1
+
+    def _leave(self, filepath):
+        record = self.remaining.get(os.path.dirname(filepath))
+        if record is not None:
+            record[1] -= 1
+
+    def organize(self):
+        moves = plan_entries(self.path, [entry for entry in self.top if entry.path not in self.gone], self.method)
+        if self.dry_run:
+            for source, destination, _ in moves:
+                self.moved[source] = destination
+                self._leave(source)
+                self._arrive(destination)
+            summary = summarize_plan(moves, self.limit)
+            log_action(f"Would move {summary['total']} files.")
+            return summary
+
+        journal = begin_operation(self.path, self.method)
+        recorder = _Recorder(journal)
+        try:
+            moved = execute_plan(self.path, moves, recorder, self.progress)
+        finally:
+            journal.close()
+        for source, destination in recorder.moves:
+            self.moved[source] = destination
+            self._leave(source)
+            self._arrive(destination)
+        log_action(f"Moved {moved} files.")
+        return {"moved": moved}
+
+    def _add_deferred(self):
+        """
+        Adds the root files to the store under the names organize gave
+        them; in a dry run those are the planned names, read through
+        _source.
+        """
+        folder_devs = {}
+        for filepath, st in self.deferred:
+            destination = self.moved.get(filepath)
+            if destination is not None:
+                folder = os.path.dirname(destination)
+                if not self.dry_run and folder not in folder_devs:
+                    try:
+                        folder_devs[folder] = os.stat(folder).st_dev
+                    except OSError:
+                        folder_devs[folder] = None
+                if not self.dry_run and folder_devs[folder] != st.st_dev:
+                    # Copied to another filesystem, so the old inode is gone
+                    try:
+                        st = os.stat(destination, follow_symlinks=False)
+                    except OSError as e:
+                        log_action(f"Error reading file {destination}: {e}")
+                        continue
+                filepath = destination
+            self.store.add(filepath, st)
+        self.deferred = []
+        if self.dry_run:
+            self.sources = {destination: source for source, destination in self.moved.items()}
+
+    def _source(self, filepath):
+        return self.sources.get(filepath, filepath)
+
+    def _removed(self, filepath):
+        self._leave(filepath)
+        if os.path.dirname(filepath) == self.path:
+            self.gone.add(filepath)
+
+    def duplicates(self):
+        self._add_deferred()
+        locate = self._source if self.dry_run else None
+        if not hash_candidates(self.store, self.progress, self.algorithm, locate):
+            return None
+        if not self.dry_run:
+            removed = delete_duplicates(self.store, self.hardlink, self.progress, on_removed=self._removed)
+            return {"removed": removed, "hardlink": self.hardlink}
+
+        report = duplicate_report(self.store, self.limit, self.algorithm)
+        if not self.hardlink:
+            # Later steps see the tree as it would be after the removals
+            for _, group in self.store.iter_groups():
+                for filepath, _ in iter_duplicates(group):
+                    self._removed(filepath)
+        log_action(f"Found {report['duplicate_files']} duplicate files "
+                   f"({report['reclaimable_bytes']} bytes reclaimable).")
+        return report
+
+    def empty_folders(self):
+        removed, errors = prune_empty_folders(self.remaining, self.progress, self.dry_run)
+        for dirpath in removed:
+            # Gone, so a later organize recreates it (and counts it in its parent again)
+            del self.remaining[dirpath]
+        verb = "Would remove" if self.dry_run else "Removed"
+        log_action(f"{verb} {len(removed)} empty folders" + (f", {errors} could not be removed." if errors else "."))
+        return {"total": len(removed), "errors": errors, "folders": removed[:self.limit]}
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+def run_pipeline(path, steps=STEPS, method="type", dry_run=False, hardlink=False, algorithm=HASH_ALGORITHM,
+                 progress=None, limit=1000):
+    """
+    Runs several maintenance steps ("organize", "duplicates" and
+    "empty_folders", see STEPS) over path, in the order given, from one
+    traversal of the tree instead of one per step. Stat data from the walk
+    feeds both the organize rules and the duplicate store, hashes are
+    computed once, and folders emptied by earlier steps are pruned
+    without listing anything again.
+
+    With dry_run nothing is changed; each step reports what it would do
+    as if the steps before it had run. Returns a dict with one result per
+    completed step, or None if path does not exist or a step name or the
+    organize method is unknown. A cancel through progress stops the run
+    after the current step, and the steps done so far are reported with
+    cancelled set.
+    """
+    unknown = [step for step in steps if step not in STEPS]
+    if unknown or len(set(steps)) != len(steps):
+        log_action(f"❌ Invalid pipeline steps: {', '.join(steps)}")
+        return None
+    if "organize" in steps and get_ruleset(method) is None:
+        log_action(f"❌ Unknown organization method: {method}")
+        return None
+
+    with track_operation("pipeline_preview" if dry_run else "pipeline") as run:
+        if not os.path.exists(path):
+            log_action(f"❌ Path does not exist: {path}")
+            run.failed = True
+            return None
+
+        pipeline = _Pipeline(os.path.abspath(path), list(steps), method, dry_run, hardlink, algorithm,
+                             progress, limit)
+        result = {"path": pipeline.path, "dry_run": dry_run, "steps": [], "cancelled": False}
+        try:
+            log_action(f"Scanning {pipeline.path} for: {', '.join(steps)}")
+            if not pipeline.scan():
+                result["cancelled"] = True
+                return result
+            run.files = pipeline.files
+            result["files_scanned"] = pipeline.files
+            result["folders_scanned"] = len(pipeline.remaining)
+
+            for step in steps:
+                outcome = getattr(pipeline, step)()
+                if outcome is not None:
+                    result["steps"].append({"step": step, **outcome})
+                if outcome is None or pipeline.cancelled():
+                    result["cancelled"] = True
+                    break
+        finally:
+            pipeline.close()
+
+        if result["cancelled"]:
+            log_action(f"⚠️ Pipeline cancelled after {len(result['steps'])} of {len(steps)} steps.")
+        else:
+            log_action(f"✅ Pipeline finished: {', '.join(steps)}.")
+        return result
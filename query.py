@@ -0,0 +1,180 @@
+import datetime
+import fnmatch
+import os
+import re
+import shlex
+import time
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+              "g": 1024 ** 3, "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+_SIZE = re.compile(r"^(\d+(?:\.\d+)?)\s*([a-z]*)$")
+_DAYS_AGO = re.compile(r"^(\d+)d$")
+
+class SearchQuery:
+    """
+    A parsed search. Every condition must hold for a file to match.
+
+    Conditions on the name alone are checked by match_name, cheapest
+    first, before anything needs a stat; size and mtime conditions are
+    checked by match_stat only for files whose name already matched.
+    """
+
+    def __init__(self, terms=(), extensions=None, glob=None, regex=None,
+                 min_size=None, max_size=None, modified_after=None, modified_before=None):
+        self.terms = [term.lower() for term in terms]
+        self.extensions = {("." + ext.lstrip(".")).lower() for ext in extensions} if extensions else None
+        self.glob = glob
+        self.regex = regex
+        self._glob = re.compile(fnmatch.translate(glob), re.IGNORECASE) if glob else None
+        try:
+            self._regex = re.compile(regex, re.IGNORECASE) if regex else None
+        except re.error as e:
+            raise ValueError(f"invalid regex: {e}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = modified_after
+        self.modified_before = modified_before
+
+    @property
+    def needs_stat(self):
+        return (self.min_size is not None or self.max_size is not None
+                or self.modified_after is not None or self.modified_before is not None)
+
+    def match_name(self, name):
+        if self.extensions is not None and os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+        if self.terms:
+            lowered = name.lower()
+            if not all(term in lowered for term in self.terms):
+                return False
+        if self._glob is not None and not self._glob.match(name):
+            return False
+        if self._regex is not None and not self._regex.search(name):
+            return False
+        return True
+
+    def match_stat(self, size, mtime):
+        if self.min_size is not None and (size is None or size < self.min_size):
+            return False
+        if self.max_size is not None and (size is None or size > self.max_size):
+            return False
+        if self.modified_after is not None and (mtime is None or mtime < self.modified_after):
+            return False
+        if self.modified_before is not None and (mtime is None or mtime > self.modified_before):
+            return False
+        return True
+
+def parse_size(text):
+    match = _SIZE.match(text.strip().lower())
+    if not match or match.group(2) not in SIZE_UNITS:
+        raise ValueError(f"invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+def parse_time(text, end_of_day=False):
+    """A YYYY-MM-DD date (its start, or its end with end_of_day) or Nd for N days ago, as a timestamp."""
+    text = text.strip()
+    days = _DAYS_AGO.match(text)
+    if days:
+        return time.time() - int(days.group(1)) * 86400
+    try:
+        day = datetime.datetime.strptime(text, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"invalid date: {text} (use YYYY-MM-DD or Nd)")
+    if end_of_day:
+        day += datetime.timedelta(days=1)
+    return day.timestamp()
+
+def _size_span(text):
+    """The bytes a size stands for, as [start, end)."""
+    size = parse_size(text)
+    return size, size + 1
+
+def _time_span(text):
+    """The seconds a date (the whole day) or Nd (that second) stands for, as [start, end)."""
+    start = parse_time(text)
+    if _DAYS_AGO.match(text.strip()):
+        return start, start + 1
+    return start, parse_time(text, end_of_day=True)
+
+def _parse_range(text, span, step):
+    """
+    Parses >x, >=x, <x, <=x, a..b or an exact value into inclusive
+    (low, high) bounds. span gives the [start, end) a value stands for,
+    and step is the smallest difference the bounds can express, so > and
+    < leave out the value itself.
+    """
+    if ".." in text:
+        low, high = text.split("..", 1)
+        return (span(low)[0] if low else None), (span(high)[1] - step if high else None)
+    for prefix in (">=", "<=", ">", "<"):
+        if text.startswith(prefix):
+            start, end = span(text[len(prefix):])
+            return {">=": (start, None), ">": (end, None),
+                    "<=": (None, end - step), "<": (None, start - step)}[prefix]
+    start, end = span(text)
+    return start, end - step
+
+def _intersect(options, low_key, high_key, bounds):
+    """Narrows options[low_key]..options[high_key] to bounds, so repeated filters all apply."""
+    low, high = bounds
+    if low is not None:
+        current = options.get(low_key)
+        options[low_key] = low if current is None else max(current, low)
+    if high is not None:
+        current = options.get(high_key)
+        options[high_key] = high if current is None else min(current, high)
+
+def _tokenize(text):
+    """
+    Splits a query on whitespace. Only double quotes group words, and
+    backslashes are kept, so apostrophes, regexes and Windows paths pass
+    through as typed. Text with an unclosed quote is one single term.
+    """
+    lexer = shlex.shlex(text, posix=True)
+    lexer.whitespace_split = True
+    lexer.quotes = '"'
+    lexer.escape = ""
+    lexer.commenters = ""
+    try:
+        return list(lexer)
+    except ValueError:
+        return [text.strip()]
+
+def parse_query(text):
+    """
+    Parses a search string into a SearchQuery. Words are matched as
+    case-insensitive substrings of the name (put them in double quotes
+    to include spaces); the filters are:
+
+        ext:pdf,docx          extension
+        glob:*.tmp            shell pattern for the whole name
+        re:^inv\\d+           regular expression searched in the name
+        size:>10MB            also <, >=, <= and ranges like 1MB..5MB
+        modified:>2024-01-01  also <, ranges, and Nd for N days ago
+
+    > and < leave out the value itself (for a date, the whole day), and
+    repeating size: or modified: narrows the range to what all of them allow.
+
+    Raises ValueError for malformed filters.
+    """
+    terms = []
+    options = {}
+    for token in _tokenize(text):
+        key, sep, value = token.partition(":")
+        key = key.lower()
+        if not sep or key not in ("ext", "glob", "re", "regex", "size", "modified"):
+            terms.append(token)
+            continue
+        if not value:
+            raise ValueError(f"missing value for {key}:")
+        if key == "ext":
+            options.setdefault("extensions", []).extend(ext for ext in value.split(",") if ext)
+        elif key == "glob":
+            options["glob"] = value
+        elif key in ("re", "regex"):
+            options["regex"] = value
+        elif key == "size":
+            _intersect(options, "min_size", "max_size", _parse_range(value, _size_span, 1))
+        elif key == "modified":
+            _intersect(options, "modified_after", "modified_before", _parse_range(value, _time_span, 1))
+    return SearchQuery(terms, **options)
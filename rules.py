@@ -0,0 +1,203 @@
+import fnmatch
+import json
+import os
+import re
+import string
+import threading
+import time
+from config import FILE_TYPES, RULES_FILE
+from logger import log_action
+
+OTHERS_FOLDER = "Others"
+DAY = 24 * 60 * 60
+# Placeholders a destination template may use
+TEMPLATE_FIELDS = {"name", "stem", "ext", "year", "month", "day"}
+RULE_KEYS = {"name", "extensions", "glob", "regex", "ignore_case", "min_size", "max_size",
+             "min_age_days", "max_age_days", "destination"}
+
+class Rule:
+    """
+    One compiled rule. A file matches when every condition the rule sets
+    holds; extensions are checked by the RuleSet's dispatch table, the
+    rest here. destination is a folder template relative to the organized
+    directory, or None to leave matching files where they are.
+    """
+    __slots__ = ("name", "extensions", "pattern", "regex", "min_size", "max_size", "min_age_days",
+                 "max_age_days", "destination", "_fields", "needs_stat")
+
+    def __init__(self, spec, index):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"rule {index}: unknown keys {sorted(unknown)}")
+        if "destination" not in spec:
+            raise ValueError(f"rule {index}: a destination is required")
+
+        self.name = spec.get("name") or f"rule {index}"
+        extensions = spec.get("extensions")
+        if isinstance(extensions, str):
+            extensions = [extensions]
+        self.extensions = {("." + ext.lstrip(".")).lower() if ext else "" for ext in extensions} if extensions else None
+
+        patterns = []
+        if spec.get("glob"):
+            patterns.append(fnmatch.translate(spec["glob"]))
+        if spec.get("regex"):
+            # Searched anywhere in the name, like re.search; anchor with ^ and $
+            patterns.append(f"[\\s\\S]*?(?:{spec['regex']})")
+        # A glob and a regex on the same rule must both match
+        self.pattern = None
+        self.regex = None
+        if patterns:
+            flags = "(?i:" if spec.get("ignore_case") else "(?:"
+            self.pattern = flags + "".join(f"(?={p})" for p in patterns) + ")"
+            try:
+                self.regex = re.compile(self.pattern)
+            except re.error as e:
+                raise ValueError(f"{self.name}: invalid pattern: {e}")
+
+        self.min_size = spec.get("min_size")
+        self.max_size = spec.get("max_size")
+        self.min_age_days = spec.get("min_age_days")
+        self.max_age_days = spec.get("max_age_days")
+
+        self.destination = spec["destination"]
+        self._fields = set()
+        if self.destination is not None:
+            self._fields = {field for _, field, _, _ in string.Formatter().parse(self.destination) if field}
+            if self._fields - TEMPLATE_FIELDS:
+                raise ValueError(f"{self.name}: unknown template fields {sorted(self._fields - TEMPLATE_FIELDS)}")
+        self.needs_stat = (self.min_size is not None or self.max_size is not None
+                           or self.min_age_days is not None or self.max_age_days is not None
+                           or bool(self._fields & {"year", "month", "day"}))
+
+    def accepts(self, st, now):
+        """Checks the size and age conditions against a stat result."""
+        if self.min_size is not None and st.st_size < self.min_size:
+            return False
+        if self.max_size is not None and st.st_size > self.max_size:
+            return False
+        age = (now - st.st_mtime) / DAY
+        if self.min_age_days is not None and age < self.min_age_days:
+            return False
+        if self.max_age_days is not None and age > self.max_age_days:
+            return False
+        return True
+
+    def render(self, name, ext, st):
+        """Fills in the destination template for one file."""
+        if not self._fields:
+            return self.destination
+        values = {"name": name, "stem": name[:len(name) - len(ext)] if ext else name, "ext": ext.lstrip(".")}
+        if st is not None:
+            mtime = time.localtime(st.st_mtime)
+            values.update(year=f"{mtime.tm_year:04d}", month=f"{mtime.tm_mon:02d}", day=f"{mtime.tm_mday:02d}")
+        return self.destination.format_map(values)
+
+class RuleSet:
+    """
+    An ordered list of rules compiled for fast first-match lookup.
+
+    Each extension maps to the (ordered) rules that can apply to it, so a
+    file only ever looks at rules for its own extension plus those with no
+    extension condition. When no pattern has capture groups, the name
+    patterns of all rules are also combined into one regex that is tried
+    once per file, so files matching no pattern skip every pattern rule
+    without running them one by one.
+    """
+
+    def __init__(self, name, specs):
+        self.name = name
+        self.rules = [Rule(spec, index) for index, spec in enumerate(specs)]
+
+        generic = [rule for rule in self.rules if rule.extensions is None]
+        self._by_ext = {}
+        for ext in {ext for rule in self.rules if rule.extensions for ext in rule.extensions}:
+            self._by_ext[ext] = tuple(rule for rule in self.rules
+                                      if rule.extensions is None or ext in rule.extensions)
+        self._generic = tuple(generic)
+
+        self._any_pattern = None
+        patterns = [rule for rule in self.rules if rule.pattern]
+        # Joining patterns renumbers their groups, which breaks backreferences and
+        # clashes on repeated group names, so rules with groups are matched one by one
+        if patterns and not any(rule.regex.groups for rule in patterns):
+            try:
+                self._any_pattern = re.compile("|".join(rule.pattern for rule in patterns))
+            except re.error:
+                pass
+
+    def destination(self, entry, now=None):
+        """Returns the destination folder for a DirEntry, or None to leave it in place."""
+        name = entry.name
+        ext = os.path.splitext(name)[1].lower()
+        candidates = self._by_ext.get(ext, self._generic)
+        if not candidates:
+            return None
+
+        pattern_hit = None
+        st = None
+        for rule in candidates:
+            if rule.pattern is not None:
+                if pattern_hit is None:
+                    pattern_hit = self._any_pattern is None or self._any_pattern.match(name) is not None
+                if not pattern_hit or not rule.regex.match(name):
+                    continue
+            if rule.needs_stat:
+                if st is None:
+                    st = entry.stat()
+                    now = time.time() if now is None else now
+                if not rule.accepts(st, now):
+                    continue
+            folder = rule.render(name, ext, st)
+            if not folder.strip().strip("/\\"):
+                # e.g. "{ext}" for a file with no extension; the next rule may still apply
+                continue
+            return folder
+        return None
+
+def default_rulesets():
+    """The built-in "type" and "date" methods, expressed as rules."""
+    type_rules = [{"name": folder, "extensions": extensions, "destination": folder}
+                  for folder, extensions in FILE_TYPES.items()]
+    type_rules.append({"name": OTHERS_FOLDER, "destination": OTHERS_FOLDER})
+    return {
+        "type": type_rules,
+        # Modification time is more reliable across OSes than creation time
+        "date": [{"name": "By month", "destination": "{year}-{month}"}]
+    }
+
+def load_rulesets(path=RULES_FILE):
+    """
+    Compiles the built-in rule sets plus those in the rules file, which may
+    also redefine "type" and "date". Returns a dict of name -> RuleSet.
+    """
+    specs = default_rulesets()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            specs.update(json.load(f).get("rulesets", {}))
+    return {name: RuleSet(name, rules) for name, rules in specs.items()}
+
+_rulesets = None
+_load_lock = threading.Lock()
+
+def reload_rules(path=RULES_FILE):
+    """(Re)loads the rules file; on errors the built-in rule sets are used."""
+    global _rulesets
+    with _load_lock:
+        try:
+            _rulesets = load_rulesets(path)
+        except (OSError, ValueError, TypeError, AttributeError, re.error) as e:
+            log_action(f"❌ Invalid rules file {path}, using built-in rules: {e}")
+            _rulesets = {name: RuleSet(name, rules) for name, rules in default_rulesets().items()}
+    return _rulesets
+
+def get_ruleset(name):
+    """Returns the compiled rule set for an organize method, or None if there is none."""
+    if _rulesets is None:
+        reload_rules()
+    return _rulesets.get(name)
+
+def list_rulesets():
+    if _rulesets is None:
+        reload_rules()
+    return sorted(_rulesets)
@@ -0,0 +1,139 @@
+import fnmatch
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Directory listings are I/O bound (especially on network shares), so a
+# handful of threads listing sibling subtrees at once hides most of the latency
+SCAN_WORKERS = 8
+
+def _matches(name, patterns):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def scan_dir(path, include=None, exclude=None, links=False):
+    """
+    Lists one directory with os.scandir.
+
+    Returns (path, dirs, files) where dirs are the real subdirectories to
+    descend into and files are every other entry, both as DirEntry objects
+    so callers can reuse their cached type and stat data. Symlinks to
+    directories are never followed, and are only reported (among files)
+    when links is true. Names matching an exclude pattern are dropped
+    (pruning whole subtrees for directories) and files must match an
+    include pattern when include is given.
+    """
+    dirs = []
+    files = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if exclude and _matches(entry.name, exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(entry)
+                        continue
+                    if not links and entry.is_symlink() and entry.is_dir():
+                        continue
+                except OSError:
+                    pass
+                if include and not _matches(entry.name, include):
+                    continue
+                files.append(entry)
+    except OSError:
+        # Unreadable directories are skipped, the same as os.walk does
+        pass
+    return path, dirs, files
+
+def walk(top, include=None, exclude=None, workers=None, links=False):
+    """
+    Yields (dirpath, dirs, files) for top and every directory below it.
+
+    Like os.walk(topdown=True), a directory is always yielded before its
+    children and the caller may remove entries from dirs to skip them.
+    With more than one worker, independent subtrees are listed in parallel
+    so sibling order is not deterministic. links is passed to scan_dir.
+    """
+    workers = SCAN_WORKERS if workers is None else workers
+
+    if workers <= 1:
+        stack = [top]
+        while stack:
+            dirpath, dirs, files = scan_dir(stack.pop(), include, exclude, links)
+            yield dirpath, dirs, files
+            stack.extend(entry.path for entry in reversed(dirs))
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        pending = {pool.submit(scan_dir, top, include, exclude, links)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirpath, dirs, files = future.result()
+                yield dirpath, dirs, files
+                # Submitted after the yield so the caller can prune dirs first
+                for entry in dirs:
+                    pending.add(pool.submit(scan_dir, entry.path, include, exclude, links))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def walk_depth_first(top, include=None, exclude=None, workers=None, links=False):
+    """
+    walk, but strictly depth-first: a subtree is finished before its next
+    sibling starts, so callers that keep state for each directory until
+    its subtree is done hold at most one chain of ancestors. The next few
+    directories on the stack are listed ahead of time on a thread pool,
+    which keeps most of walk's parallel speed-up.
+    """
+    workers = SCAN_WORKERS if workers is None else workers
+    if workers <= 1:
+        yield from walk(top, include, exclude, 1, links)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        stack = [top]
+        listing = {}
+        while stack:
+            # The directories next in line are listed while this one is handled
+            for path in stack[-2 * workers:]:
+                if path not in listing:
+                    listing[path] = pool.submit(scan_dir, path, include, exclude, links)
+            dirpath, dirs, files = listing.pop(stack.pop()).result()
+            yield dirpath, dirs, files
+            # Extended after the yield so the caller can prune dirs first
+            stack.extend(entry.path for entry in reversed(dirs))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_files(top, include=None, exclude=None, workers=None):
+    """Yields a DirEntry for every non-directory entry below top."""
+    for _, _, files in walk(top, include, exclude, workers):
+        yield from files
+
+def iter_files_sorted(top, after_parts=None):
+    """
+    Yields file DirEntries below top in a stable, name-sorted depth-first
+    order. after_parts are the path components (relative to top) of an
+    entry already returned; everything up to and including it is skipped
+    without descending into the subtrees that precede it.
+    """
+    _, dirs, files = scan_dir(top)
+    entries = sorted(dirs + files, key=lambda e: e.name)
+    subdirs = {entry.name for entry in dirs}
+
+    bound = after_parts[0] if after_parts else None
+    for entry in entries:
+        if bound is not None:
+            if entry.name < bound:
+                continue
+            if entry.name == bound:
+                if len(after_parts) > 1 and entry.name in subdirs:
+                    yield from iter_files_sorted(entry.path, after_parts[1:])
+                continue
+            bound = None
+
+        if entry.name in subdirs:
+            yield from iter_files_sorted(entry.path)
+        else:
+            yield entry
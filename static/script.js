@@ -7,9 +7,8 @@ document.addEventListener("DOMContentLoaded", () => {
     // Load storage info
     fetchStorage();
 
-    // Start polling logs immediately
-    pollLogs();
-    setInterval(pollLogs, 1000); // Fetch logs every 1 second
+    // Follow the activity log (pushed over SSE, with polling as a fallback)
+    startLogStream();
 });
 
 /**
@@ -85,9 +84,14 @@ if (picker) {
 
 const ENDPOINTS = {
     organize: "/api/organize",
+    organize_preview: "/api/organize",
     undo: "/api/undo",
     duplicates: "/api/clean/duplicates",
+    duplicates_preview: "/api/clean/duplicates",
     empty_folders: "/api/clean/empty_folders",
+    empty_folders_preview: "/api/clean/empty_folders",
+    pipeline: "/api/pipeline",
+    pipeline_preview: "/api/pipeline",
 };
 
 /**
@@ -108,7 +112,7 @@ async function triggerAction(actionName) {
     };
 
     // If organizing, determine method
-    if (actionName === 'organize') {
+    if (actionName.startsWith('organize')) {
         const methodRadios = document.getElementsByName('org-method');
         let selectedMethod = 'type';
         for (const radio of methodRadios) {
@@ -120,6 +124,25 @@ async function triggerAction(actionName) {
         payload.method = selectedMethod;
     }
 
+    // Duplicates can be compared across several roots and linked instead of deleted
+    if (actionName.startsWith('duplicates')) {
+        const extra = document.getElementById('extra-paths').value.split(';')
+            .map(p => p.trim()).filter(p => p);
+        if (extra.length > 0) payload.paths = [pathInput, ...extra];
+        payload.hardlink = document.getElementById('dup-hardlink').checked;
+    }
+
+    // The one-pass pipeline runs every cleanup step on the path, with the same linking option
+    if (actionName.startsWith('pipeline')) {
+        payload.steps = ['organize', 'duplicates', 'empty_folders'];
+        payload.hardlink = document.getElementById('dup-hardlink').checked;
+    }
+
+    // Preview actions report what would change without touching any files
+    if (actionName.endsWith('_preview')) {
+        payload.dry_run = true;
+    }
+
     const endpoint = ENDPOINTS[actionName];
     if (!endpoint) return;
 
@@ -138,7 +161,17 @@ async function triggerAction(actionName) {
 
         const data = await response.json();
 
-        if (response.ok) {
+        if (response.ok && data.job_id) {
+            // Long operations run as background jobs; follow them until they finish
+            const job = await waitForJob(data.job_id, btn);
+            if (job.status === "completed") {
+                showToast("✅", job.message);
+            } else if (job.status === "cancelled") {
+                showToast("⚠️", job.message, true);
+            } else {
+                showToast("❌", job.message, true);
+            }
+        } else if (response.ok) {
             showToast("✅", data.message);
         } else {
             showToast("❌", data.message, true);
@@ -149,44 +182,137 @@ async function triggerAction(actionName) {
     } finally {
         // Restore button state
         setButtonLoading(btn, false, originalText);
-        // Force an immediate log refresh instead of waiting for the 1s tick
+        // Catch up immediately if we are polling instead of streaming
+        if (logPollTimer) pollLogs();
+    }
+}
+
+/**
+ * Polls a background job until it completes, fails or is cancelled,
+ * showing its progress on the button and offering a Cancel button meanwhile.
+ */
+let activeJobId = null;
+
+async function waitForJob(jobId, btn) {
+    activeJobId = jobId;
+    const cancelBtn = document.getElementById("btn-cancel-job");
+    if (cancelBtn) cancelBtn.style.display = "inline-block";
+
+    try {
+        while (true) {
+            const response = await fetch(`/api/jobs/${jobId}`);
+            const data = await response.json();
+            if (!response.ok) {
+                return { status: "failed", message: data.message };
+            }
+
+            const job = data.job;
+            if (job.status !== "queued" && job.status !== "running") {
+                return job;
+            }
+
+            if (btn) {
+                btn.innerHTML = `<span style="animation: spin 1s linear infinite; display: inline-block;">⏳</span> ${formatJobProgress(job)}`;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500));
+        }
+    } finally {
+        activeJobId = null;
+        if (cancelBtn) cancelBtn.style.display = "none";
+    }
+}
+
+function formatJobProgress(job) {
+    if (job.status === "queued") return job.message || "Queued...";
+
+    let text = job.files_total
+        ? `${job.files_scanned}/${job.files_total} items`
+        : `${job.files_scanned} items`;
+    if (job.bytes_processed > 0) {
+        text += `, ${(job.bytes_processed / (1024 * 1024)).toFixed(1)} MB`;
+    }
+    if (job.eta_seconds !== null) {
+        text += `, ~${Math.ceil(job.eta_seconds)}s left`;
+    }
+    return text;
+}
+
+/**
+ * Requests cooperative cancellation of the job currently being followed.
+ */
+async function cancelActiveJob() {
+    if (!activeJobId) return;
+    try {
+        await fetch(`/api/jobs/${activeJobId}/cancel`, { method: "POST" });
+        showToast("⚠️", "Cancelling, the operation stops at the next safe point...");
+    } catch (error) {
+        showToast("❌", "Network error. Is the server running?", true);
+    }
+}
+
+/**
+ * Subscribes to the server-sent log stream. Each record carries a sequence
+ * number, so only new lines are ever transferred and appended.
+ */
+let lastLogSeq = 0;
+let logPollTimer = null;
+const MAX_LOG_LINES = 500;
+
+function startLogStream() {
+    if (!document.getElementById("log-console")) return;
+
+    if (!window.EventSource) {
+        logPollTimer = setInterval(pollLogs, 1000);
         pollLogs();
+        return;
     }
+
+    const source = new EventSource(`/api/logs/stream?since=${lastLogSeq}`);
+    source.onmessage = (event) => {
+        const seq = parseInt(event.lastEventId, 10);
+        if (seq <= lastLogSeq) return;
+        lastLogSeq = seq;
+        appendLogs([JSON.parse(event.data)]);
+    };
+    source.onerror = () => {
+        // Fall back to incremental polling if the stream cannot be kept open
+        if (source.readyState === EventSource.CLOSED && !logPollTimer) {
+            logPollTimer = setInterval(pollLogs, 1000);
+        }
+    };
 }
 
 /**
- * Fetches the recent logs from the backend memory buffer
+ * Fetches only the log records newer than the last one we rendered
  */
 async function pollLogs() {
+    if (!document.getElementById("log-console")) return;
     try {
-        const response = await fetch("/api/logs");
+        const response = await fetch(`/api/logs?since=${lastLogSeq}`);
         if (!response.ok) return;
 
         const data = await response.json();
-        renderLogs(data.logs || []);
+        const records = data.records || [];
+        if (records.length > 0) {
+            lastLogSeq = data.last_seq;
+            appendLogs(records.map(record => record.message));
+        }
     } catch (error) {
         console.error("Failed to poll logs", error);
     }
 }
 
 /**
- * Renders the log text in the fake terminal
+ * Appends new log lines to the fake terminal, keeping a capped scrollback
  */
-let lastLogCount = 0;
-function renderLogs(logs) {
+function appendLogs(logs) {
     const consoleDiv = document.getElementById("log-console");
+    if (!consoleDiv || logs.length === 0) return;
 
-    // Only update DOM if new logs arrived
-    if (logs.length === lastLogCount) return;
-    lastLogCount = logs.length;
-
-    consoleDiv.innerHTML = "";
-
-    if (logs.length === 0) {
-        consoleDiv.innerHTML = "<span class='log-entry info'>System ready. Awaiting commands...</span>";
-        return;
-    }
+    const placeholder = document.getElementById("log-placeholder");
+    if (placeholder) placeholder.remove();
 
+    const fragment = document.createDocumentFragment();
     logs.forEach(logText => {
         const span = document.createElement("div");
         span.className = "log-entry";
@@ -203,8 +329,13 @@ function renderLogs(logs) {
         }
 
         span.textContent = logText;
-        consoleDiv.appendChild(span);
+        fragment.appendChild(span);
     });
+    consoleDiv.appendChild(fragment);
+
+    while (consoleDiv.childElementCount > MAX_LOG_LINES) {
+        consoleDiv.removeChild(consoleDiv.firstElementChild);
+    }
 
     // Auto scroll to bottom
     consoleDiv.scrollTop = consoleDiv.scrollHeight;
@@ -249,9 +380,14 @@ function showToast(icon, message, isError = false) {
 function getButtonId(action) {
     const map = {
         'organize': 'btn-organize',
+        'organize_preview': 'btn-organize-preview',
         'undo': 'btn-undo',
         'duplicates': 'btn-duplicates',
-        'empty_folders': 'btn-empty'
+        'duplicates_preview': 'btn-duplicates-preview',
+        'empty_folders': 'btn-empty',
+        'empty_folders_preview': 'btn-empty-preview',
+        'pipeline': 'btn-pipeline',
+        'pipeline_preview': 'btn-pipeline-preview'
     };
     return map[action];
 }
@@ -314,77 +450,377 @@ function setButtonLoading(btn, isLoading, originalHTML = "") {
 }
 
 /**
- * Executes a Local Search via the backend OS Walk API
+ * Executes a Local Search via the backend OS Walk API.
+ * Results are streamed as NDJSON so rows appear while the walk is still running,
+ * and further pages are fetched on demand through the returned cursor.
+ */
+let searchState = { path: "", query: "", cursor: null, count: 0 };
+
+/**
+ * Combines the query box with the filter fields into one query string
+ * (see query.py for the syntax).
  */
+function buildSearchQuery() {
+    const parts = [document.getElementById('search-query').value.trim()];
+    const value = id => document.getElementById(id).value.trim().replace(/\s+/g, '');
+
+    const ext = value('filter-ext');
+    if (ext) parts.push(`ext:${ext}`);
+
+    const minSize = value('filter-min-size');
+    const maxSize = value('filter-max-size');
+    if (minSize || maxSize) parts.push(`size:${minSize}..${maxSize}`);
+
+    const after = value('filter-after');
+    const before = value('filter-before');
+    if (after || before) parts.push(`modified:${after}..${before}`);
+
+    return parts.filter(part => part).join(' ');
+}
+
 async function triggerSearch() {
     const pathInput = document.getElementById('target-path').value.trim();
-    const queryInput = document.getElementById('search-query').value.trim();
-    const btn = document.getElementById('btn-search');
+    const queryInput = buildSearchQuery();
 
     if (!pathInput || !queryInput) {
         showToast("⚠️", "Please provide both a Target Directory and a Search Query.", true);
         return;
     }
 
-    const originalHTML = btn.innerHTML;
-    setButtonLoading(btn, true, originalHTML);
-
     // Reset and show search table
     const resultsCard = document.getElementById('search-results-card');
     const tbody = document.getElementById('results-body');
     const statusText = document.getElementById('search-status');
 
     resultsCard.style.display = 'block';
-    tbody.innerHTML = '<tr><td colspan="2" style="text-align: center; color: var(--color-text-secondary); padding: 30px;">Searching, please wait...</td></tr>';
+    tbody.innerHTML = '<tr id="search-placeholder"><td colspan="2" style="text-align: center; color: var(--color-text-secondary); padding: 30px;">Searching, please wait...</td></tr>';
     statusText.textContent = `Searching inside ${pathInput}...`;
 
+    searchState = { path: pathInput, query: queryInput, cursor: null, count: 0 };
+    await fetchSearchPage('btn-search');
+}
+
+/**
+ * Loads the next page of the current search.
+ */
+async function loadMoreResults() {
+    if (!searchState.cursor) return;
+    await fetchSearchPage('btn-load-more');
+}
+
+async function fetchSearchPage(btnId) {
+    const btn = document.getElementById(btnId);
+    const tbody = document.getElementById('results-body');
+    const statusText = document.getElementById('search-status');
+    const loadMore = document.getElementById('btn-load-more');
+
+    const originalHTML = btn.innerHTML;
+    setButtonLoading(btn, true, originalHTML);
+
     try {
         const response = await fetch('/api/search', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ path: pathInput, query: queryInput })
+            body: JSON.stringify({
+                path: searchState.path,
+                query: searchState.query,
+                cursor: searchState.cursor,
+                stream: true
+            })
+        });
+
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.message || "Search failed. Please ensure the path exists.");
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let summary = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+
+            // Append each chunk in one DOM operation
+            const fragment = document.createDocumentFragment();
+            for (const line of lines) {
+                if (!line) continue;
+                const item = JSON.parse(line);
+                if (item.done) {
+                    summary = item;
+                } else {
+                    fragment.appendChild(buildResultRow(item));
+                    searchState.count++;
+                }
+            }
+
+            if (fragment.childNodes.length > 0) {
+                const placeholder = document.getElementById('search-placeholder');
+                if (placeholder) placeholder.remove();
+                tbody.appendChild(fragment);
+                statusText.textContent = `Found ${searchState.count} matches so far...`;
+            }
+        }
+
+        if (summary && summary.error) {
+            throw new Error(summary.error);
+        }
+
+        searchState.cursor = summary ? summary.next_cursor : null;
+        loadMore.style.display = searchState.cursor ? 'block' : 'none';
+
+        if (searchState.count === 0) {
+            tbody.innerHTML = '<tr><td colspan="2" style="text-align: center; color: var(--color-text-secondary); padding: 30px;">No files found matching your query.</td></tr>';
+            statusText.textContent = `0 matches found.`;
+        } else {
+            statusText.textContent = `Found ${searchState.count}${searchState.cursor ? '+' : ''} matches for "${searchState.query}"`;
+        }
+    } catch (error) {
+        showToast("❌", error.message || "Network error occurred.", true);
+        if (searchState.count === 0) {
+            tbody.innerHTML = `<tr><td colspan="2" style="text-align: center; color: var(--color-error); padding: 30px;">Error: ${error.message}</td></tr>`;
+        }
+        statusText.textContent = "Search failed.";
+        loadMore.style.display = 'none';
+    } finally {
+        setButtonLoading(btn, false, originalHTML);
+    }
+}
+
+function buildResultRow(file) {
+    const tr = document.createElement('tr');
+
+    const tdNamePath = document.createElement('td');
+    const nameSpan = document.createElement('span');
+    nameSpan.className = 'file-name';
+    nameSpan.textContent = file.name;
+    const pathSpan = document.createElement('span');
+    pathSpan.className = 'file-path';
+    pathSpan.textContent = file.path;
+    tdNamePath.appendChild(nameSpan);
+    tdNamePath.appendChild(pathSpan);
+
+    const tdSize = document.createElement('td');
+    tdSize.textContent = file.size;
+
+    tr.appendChild(tdNamePath);
+    tr.appendChild(tdSize);
+    return tr;
+}
+
+/**
+ * Builds the on-disk search index for the target directory so later
+ * searches are answered from it instead of walking the folder.
+ */
+async function triggerIndex() {
+    const pathInput = document.getElementById('target-path').value.trim();
+    const btn = document.getElementById('btn-index');
+
+    if (!pathInput) {
+        showToast("⚠️", "Please provide a Target Directory to index.", true);
+        return;
+    }
+
+    const originalHTML = btn.innerHTML;
+    setButtonLoading(btn, true, originalHTML);
+
+    try {
+        const response = await fetch('/api/index', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ path: pathInput })
         });
 
         const data = await response.json();
 
         if (response.ok && data.success) {
-            tbody.innerHTML = ''; // Clear loading
+            showToast("✅", data.message);
+        } else {
+            showToast("❌", data.message || "Indexing failed.", true);
+        }
+    } catch (error) {
+        showToast("❌", "Network error occurred.", true);
+    } finally {
+        setButtonLoading(btn, false, originalHTML);
+    }
+}
 
-            if (data.results.length === 0) {
-                tbody.innerHTML = '<tr><td colspan="2" style="text-align: center; color: var(--color-text-secondary); padding: 30px;">No files found matching your query.</td></tr>';
-                statusText.textContent = `0 matches found.`;
-            } else {
-                data.results.forEach(file => {
-                    const tr = document.createElement('tr');
+/**
+ * Starts or stops watch mode on the target directory. While watched, new
+ * files are organized by the selected method as soon as they finish writing.
+ */
+let watchedPath = null;
 
-                    const tdNamePath = document.createElement('td');
-                    tdNamePath.innerHTML = `
-                        <span class="file-name">${file.name}</span>
-                        <span class="file-path">${file.path}</span>
-                    `;
+async function toggleWatch() {
+    const pathInput = document.getElementById('target-path').value.trim();
+    const btn = document.getElementById('btn-watch');
 
-                    const tdSize = document.createElement('td');
-                    tdSize.textContent = file.size;
+    if (!watchedPath && !pathInput) {
+        showToast("⚠️", "Please paste an absolute directory path first!", true);
+        return;
+    }
 
-                    tr.appendChild(tdNamePath);
-                    tr.appendChild(tdSize);
-                    tbody.appendChild(tr);
-                });
+    let selectedMethod = 'type';
+    for (const radio of document.getElementsByName('org-method')) {
+        if (radio.checked) {
+            selectedMethod = radio.value;
+            break;
+        }
+    }
 
-                statusText.textContent = `Found ${data.results.length}${data.results.length >= 1000 ? '+' : ''} matches for "${queryInput}"`;
-            }
+    const stopping = watchedPath !== null;
+    try {
+        const response = await fetch(stopping ? '/api/watch/stop' : '/api/watch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ path: stopping ? watchedPath : pathInput, method: selectedMethod })
+        });
+        const data = await response.json();
+
+        if (response.ok && data.success) {
+            watchedPath = stopping ? null : data.watch.path;
+            btn.innerHTML = stopping ? "👀 Watch Folder" : "⏹ Stop Watching";
+            showToast("✅", data.message);
         } else {
-            showToast("❌", data.message || "Search failed. Please ensure the path exists.", true);
-            tbody.innerHTML = `<tr><td colspan="2" style="text-align: center; color: var(--color-error); padding: 30px;">Error: ${data.message}</td></tr>`;
-            statusText.textContent = "Search failed.";
+            showToast("❌", data.message, true);
         }
     } catch (error) {
-        showToast("❌", "Network error occurred.", true);
-        tbody.innerHTML = `<tr><td colspan="2" style="text-align: center; color: var(--color-error); padding: 30px;">Network Error: ${error}</td></tr>`;
-        statusText.textContent = "Search failed.";
+        showToast("❌", "Network error. Is the server running?", true);
+    }
+}
+
+/**
+ * Streams a disk usage breakdown of the target directory from
+ * /api/storage/analyze and redraws it as each partial snapshot arrives.
+ */
+const ANALYSIS_COLORS = ['#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', '#ec4899', '#14b8a6', '#eab308'];
+
+function formatBytes(size) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let unit = 0;
+    while (size >= 1024 && unit < units.length - 1) {
+        size /= 1024;
+        unit++;
+    }
+    return unit === 0 ? `${size} B` : `${size.toFixed(1)} ${units[unit]}`;
+}
+
+async function analyzeStorage() {
+    const pathInput = document.getElementById('target-path').value.trim();
+    const btn = document.getElementById('btn-analyze');
+
+    if (!pathInput) {
+        showToast("⚠️", "Please paste an absolute directory path first!", true);
+        return;
+    }
+
+    const originalHTML = btn.innerHTML;
+    setButtonLoading(btn, true, originalHTML);
+    document.getElementById('analysis-results').style.display = 'block';
+    document.getElementById('analysis-status').textContent = `Scanning ${pathInput}...`;
+
+    try {
+        const response = await fetch('/api/storage/analyze', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ path: pathInput, top: 10 })
+        });
+
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.message || "Analysis failed.");
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let latest = null;
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+
+            // Only the newest snapshot in a chunk is worth drawing
+            for (const line of lines) {
+                if (line) latest = JSON.parse(line);
+            }
+            if (latest) {
+                if (latest.error) throw new Error(latest.error);
+                renderAnalysis(latest);
+            }
+        }
+    } catch (error) {
+        showToast("❌", error.message || "Network error occurred.", true);
+        document.getElementById('analysis-status').textContent = "Analysis failed.";
     } finally {
         setButtonLoading(btn, false, originalHTML);
     }
 }
+
+function renderAnalysis(snapshot) {
+    const scanning = snapshot.done ? '' : ' (scanning...)';
+    document.getElementById('analysis-status').textContent =
+        `${formatBytes(snapshot.size)} in ${snapshot.files} files, ${snapshot.folders} folders${scanning}`;
+
+    // Extension shares as consecutive dash segments along the gauge arc
+    const segments = document.getElementById('analysis-segments');
+    segments.innerHTML = '';
+    let start = 0;
+    snapshot.extensions.forEach((ext, i) => {
+        const share = snapshot.size ? (ext.size / snapshot.size) * 100 : 0;
+        const path = document.createElementNS('http://www.w3.org/2000/svg', 'path');
+        path.setAttribute('d', 'M 10 50 A 40 40 0 0 1 90 50');
+        path.setAttribute('fill', 'none');
+        path.setAttribute('pathLength', '100');
+        path.setAttribute('class', 'analysis-segment');
+        path.style.stroke = ANALYSIS_COLORS[i % ANALYSIS_COLORS.length];
+        path.style.strokeDasharray = `${share} 100`;
+        path.style.strokeDashoffset = `${-start}`;
+        segments.appendChild(path);
+        start += share;
+    });
+
+    renderAnalysisList('analysis-extensions', snapshot.extensions.map(
+        ext => [ext.extension, ext.size, `${formatBytes(ext.size)} · ${ext.files} files`]), snapshot.size, true);
+    renderAnalysisList('analysis-ages', snapshot.ages.map(
+        age => [age.label, age.size, `${formatBytes(age.size)} · ${age.files} files`]), snapshot.size);
+    renderAnalysisList('analysis-folders', snapshot.largest_folders.map(
+        folder => [folder.path, folder.size, formatBytes(folder.size)]), snapshot.size);
+    renderAnalysisList('analysis-files', snapshot.largest_files.map(
+        file => [file.path, file.size, formatBytes(file.size)]), snapshot.size);
+}
+
+function renderAnalysisList(id, rows, total, colored = false) {
+    const list = document.getElementById(id);
+    const fragment = document.createDocumentFragment();
+    rows.forEach(([label, size, text], i) => {
+        const li = document.createElement('li');
+        const bar = document.createElement('span');
+        bar.className = 'bar';
+        bar.style.width = `${total ? (size / total) * 100 : 0}%`;
+        if (colored) bar.style.background = ANALYSIS_COLORS[i % ANALYSIS_COLORS.length] + '40';
+        const labelSpan = document.createElement('span');
+        labelSpan.className = 'label';
+        labelSpan.textContent = label;
+        const valueSpan = document.createElement('span');
+        valueSpan.className = 'value';
+        valueSpan.textContent = text;
+        li.append(bar, labelSpan, valueSpan);
+        fragment.appendChild(li);
+    });
+    list.replaceChildren(fragment);
+}
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from metrics import CACHE_HITS, CACHE_MISSES
+from scanner import scan_dir, walk
+
+# Queries this soon after a refresh are answered without touching the disk
+MIN_REFRESH_INTERVAL = 2
+# Directory mtimes do not change when a file is rewritten in place, so every
+# cached tree is rebuilt from scratch this often to pick up such size changes
+FULL_RESCAN_INTERVAL = 300
+
+class _DirNode:
+    """Cached totals of one directory and its subtree."""
+    __slots__ = ("mtime_ns", "own_size", "own_files", "children", "size", "files", "folders")
+
+    def __init__(self, mtime_ns=None):
+        self.mtime_ns = mtime_ns
+        self.own_size = 0
+        self.own_files = 0
+        self.children = {}
+        self.size = 0
+        self.files = 0
+        self.folders = 0
+
+    def totals(self):
+        return self.size, self.files, self.folders
+
+    def sum_children(self):
+        self.size = self.own_size + sum(child.size for child in self.children.values())
+        self.files = self.own_files + sum(child.files for child in self.children.values())
+        self.folders = len(self.children) + sum(child.folders for child in self.children.values())
+
+class _CachedRoot:
+    def __init__(self, node):
+        self.node = node
+        self.built_at = time.time()
+        self.refreshed_at = self.built_at
+        # Serialises refreshes of this tree
+        self.lock = threading.Lock()
+
+_roots = {}
+# Guards _roots only; scans run outside it, so a slow first scan of one
+# root never holds up queries on another
+_lock = threading.Lock()
+# path -> lock held during its first scan, so concurrent queries scan it once
+_building = {}
+
+def _fill(node, files):
+    """Sets a node's own file totals from its directory listing."""
+    node.own_size = 0
+    node.own_files = 0
+    for entry in files:
+        if entry.is_symlink():
+            continue
+        try:
+            node.own_size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+        node.own_files += 1
+
+def _build(path):
+    """Scans a whole tree with the parallel walker and returns its root node."""
+    root = _DirNode(os.stat(path).st_mtime_ns)
+    nodes = {path: root}
+    for dirpath, dirs, files in walk(path):
+        node = nodes[dirpath]
+        _fill(node, files)
+        for entry in dirs:
+            try:
+                mtime_ns = entry.stat(follow_symlinks=False).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            child = _DirNode(mtime_ns)
+            node.children[entry.name] = child
+            nodes[entry.path] = child
+
+    # Children before parents
+    for dirpath in sorted(nodes, key=lambda p: p.count(os.sep), reverse=True):
+        nodes[dirpath].sum_children()
+    return root
+
+def _refresh(path, node):
+    """
+    Brings a cached subtree up to date. Every directory is stat'ed, but only
+    those whose mtime changed are listed again; unchanged directories keep
+    their own totals. Returns the node, or None if the directory is gone.
+    """
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return None
+
+    if node is None or node.mtime_ns != st.st_mtime_ns:
+        CACHE_MISSES.inc(cache="storage")
+        _, dirs, files = scan_dir(path)
+        fresh = _DirNode(st.st_mtime_ns)
+        _fill(fresh, files)
+        old_children = node.children if node is not None else {}
+        for entry in dirs:
+            fresh.children[entry.name] = old_children.get(entry.name)
+        node = fresh
+    else:
+        CACHE_HITS.inc(cache="storage")
+
+    for name, child in list(node.children.items()):
+        child = _refresh(os.path.join(path, name), child)
+        if child is None:
+            del node.children[name]
+        else:
+            node.children[name] = child
+
+    node.sum_children()
+    return node
+
+def _find_cached(path):
+    """
+    Returns (root path, cached root) of the innermost cached tree
+    containing path, or (None, None). A folder created after its parent
+    was cached becomes a root of its own, and must be found before the
+    parent, whose tree does not have it.
+    """
+    found = None, None
+    for root_path, cached in _roots.items():
+        if path == root_path or path.startswith(root_path.rstrip(os.sep) + os.sep):
+            if found[0] is None or len(root_path) > len(found[0]):
+                found = root_path, cached
+    return found
+
+def _chain(cached, root_path, path):
+    """The nodes from the cached root down to path, or None if path is not in the tree."""
+    chain = [cached.node]
+    if path != root_path:
+        for name in os.path.relpath(path, root_path).split(os.sep):
+            child = chain[-1].children.get(name)
+            if child is None:
+                return None
+            chain.append(child)
+    return chain
+
+def _build_root(path):
+    """Scans path as a new cached root and returns its totals."""
+    start = time.time()
+    with _lock:
+        build_lock = _building.setdefault(path, threading.Lock())
+    with build_lock:
+        with _lock:
+            cached = _roots.get(path)
+        if cached is not None and cached.built_at >= start:
+            # Scanned by another query while this one waited
+            with cached.lock:
+                return cached.node.totals()
+        try:
+            node = _build(path)
+        finally:
+            with _lock:
+                _building.pop(path, None)
+        with _lock:
+            # A new root replaces any cached roots nested inside it
+            for root_path in list(_roots):
+                if root_path.startswith(path.rstrip(os.sep) + os.sep):
+                    del _roots[root_path]
+            _roots[path] = _CachedRoot(node)
+    return node.totals()
+
+def get_directory_totals(path):
+    """
+    Returns (total_size, file_count, folder_count) for a directory tree.
+
+    The first query scans the tree; later queries only re-list directories
+    whose mtime changed and roll the difference up to every cached ancestor.
+    Each cached tree has its own lock, so queries on different roots never
+    wait for each other.
+    """
+    path = os.path.abspath(path)
+    with _lock:
+        root_path, cached = _find_cached(path)
+        if cached is not None and time.time() - cached.built_at > FULL_RESCAN_INTERVAL:
+            del _roots[root_path]
+            cached = None
+    if cached is None:
+        return _build_root(path)
+
+    with cached.lock:
+        chain = _chain(cached, root_path, path)
+        if chain is not None:
+            now = time.time()
+            if now - cached.refreshed_at < MIN_REFRESH_INTERVAL:
+                # Not even a stat per directory this time
+                CACHE_HITS.inc(chain[-1].folders + 1, cache="storage")
+                return chain[-1].totals()
+
+            target = chain[-1]
+            before = target.totals()
+            refreshed = _refresh(path, target)
+            if refreshed is None:
+                raise FileNotFoundError(path)
+
+            # Re-link the refreshed node and roll its change up the ancestors
+            if len(chain) > 1:
+                chain[-2].children[os.path.basename(path)] = refreshed
+            else:
+                cached.node = refreshed
+                cached.refreshed_at = now
+            after = refreshed.totals()
+            for ancestor in chain[:-1]:
+                ancestor.size += after[0] - before[0]
+                ancestor.files += after[1] - before[1]
+                ancestor.folders += after[2] - before[2]
+            return after
+    # A folder created since the cached tree was last refreshed
+    return _build_root(path)
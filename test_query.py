@@ -0,0 +1,66 @@
+import datetime
+import time
+
+import pytest
+
+from query import parse_query
+
+def _day(text):
+    return datetime.datetime.strptime(text, "%Y-%m-%d").timestamp()
+
+def test_size_strict_bounds_leave_out_the_value():
+    query = parse_query("size:>1KB")
+    assert (query.min_size, query.max_size) == (1025, None)
+    assert not query.match_stat(1024, 0)
+    assert query.match_stat(1025, 0)
+
+    query = parse_query("size:<1KB")
+    assert (query.min_size, query.max_size) == (None, 1023)
+    assert not query.match_stat(1024, 0)
+    assert query.match_stat(1023, 0)
+
+def test_size_inclusive_bounds_keep_the_value():
+    assert parse_query("size:>=1KB").match_stat(1024, 0)
+    assert parse_query("size:<=1KB").match_stat(1024, 0)
+    query = parse_query("size:1KB..2KB")
+    assert (query.min_size, query.max_size) == (1024, 2048)
+    query = parse_query("size:100")
+    assert (query.min_size, query.max_size) == (100, 100)
+
+def test_modified_strict_bounds_leave_out_the_day():
+    query = parse_query("modified:>2024-01-01")
+    assert query.modified_after == _day("2024-01-02")
+    assert not query.match_stat(0, _day("2024-01-01") + 3600)
+
+    query = parse_query("modified:<2024-01-01")
+    assert query.modified_before == _day("2024-01-01") - 1
+    assert not query.match_stat(0, _day("2024-01-01"))
+    assert query.match_stat(0, _day("2023-12-31") + 3600)
+
+def test_modified_inclusive_bounds_keep_the_day():
+    query = parse_query("modified:2024-01-01")
+    assert query.match_stat(0, _day("2024-01-01"))
+    assert query.match_stat(0, _day("2024-01-01") + 86399)
+    assert not query.match_stat(0, _day("2024-01-02"))
+
+def test_modified_days_ago_strict_bound():
+    before = time.time()
+    query = parse_query("modified:>7d")
+    assert query.modified_after >= before - 7 * 86400 + 1
+
+def test_repeated_size_filters_intersect():
+    query = parse_query("size:>1KB size:<1MB")
+    assert (query.min_size, query.max_size) == (1025, 1024 ** 2 - 1)
+    query = parse_query("size:1KB..1MB size:>=10KB size:<=2MB")
+    assert (query.min_size, query.max_size) == (10 * 1024, 1024 ** 2)
+
+def test_repeated_modified_filters_intersect():
+    query = parse_query("modified:>=2024-01-01 modified:<2024-02-01 modified:2024-01-01..2024-12-31")
+    assert query.modified_after == _day("2024-01-01")
+    assert query.modified_before == _day("2024-02-01") - 1
+
+def test_malformed_range_raises():
+    with pytest.raises(ValueError):
+        parse_query("size:>lots")
+    with pytest.raises(ValueError):
+        parse_query("modified:<yesterday")
@@ -0,0 +1,209 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import HASH_ALGORITHM, VERIFY_TRANSFERS
+from hasher import hash_file
+from logger import log_action
+from metrics import BYTES_TRANSFERRED, TRANSFER_THROUGHPUT
+
+# Files moved across devices at once; copying is mostly waiting on the disks
+TRANSFER_WORKERS = 4
+# Bytes per copy_file_range/sendfile call, so progress moves on big files
+COPY_CHUNK = 8 * 1024 * 1024
+# ioctl asking the filesystem to share the source's extents (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+# Errors meaning "this copy method does not work here", not "the copy failed"
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+
+def _clone(src_fd, dst_fd):
+    """Tries a reflink, which copies no data at all. Returns False where unsupported."""
+    try:
+        import fcntl
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (ImportError, OSError):
+        return False
+
+def _copy_kernel(copy, src_fd, dst_fd, size, on_chunk):
+    """Copies with copy_file_range or sendfile, leaving the data in the kernel."""
+    offset = 0
+    while offset < size:
+        if copy is os.sendfile:
+            count = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK, size - offset))
+        else:
+            count = os.copy_file_range(src_fd, dst_fd, min(COPY_CHUNK, size - offset), offset, offset)
+        if count == 0:
+            if offset == 0:
+                # Some filesystems report success without copying anything
+                raise OSError(errno.EINVAL, "nothing copied")
+            break
+        offset += count
+        if on_chunk is not None:
+            on_chunk(count)
+    return offset
+
+def _copy_buffered(src_fd, dst_fd, size, on_chunk):
+    buffer = memoryview(bytearray(min(COPY_CHUNK, max(size, 1))))
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    os.lseek(dst_fd, 0, os.SEEK_SET)
+    copied = 0
+    while True:
+        count = os.readv(src_fd, [buffer])
+        if not count:
+            return copied
+        view = buffer[:count]
+        while view:
+            view = view[os.write(dst_fd, view):]
+        copied += count
+        if on_chunk is not None:
+            on_chunk(count)
+
+def copy_file(source, destination, on_chunk=None):
+    """
+    Copies a regular file's data and timestamps to destination. The fastest
+    method that works is used: a reflink, then copy_file_range, then
+    sendfile, and only then a read/write loop. Returns the method's name.
+    """
+    with open(source, "rb", buffering=0) as src, open(destination, "wb", buffering=0) as dst:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+        size = os.fstat(src_fd).st_size
+        method = "reflink"
+        if not _clone(src_fd, dst_fd):
+            for method, copy in (("copy_file_range", getattr(os, "copy_file_range", None)),
+                                 ("sendfile", getattr(os, "sendfile", None))):
+                if copy is None:
+                    continue
+                try:
+                    _copy_kernel(copy, src_fd, dst_fd, size, on_chunk)
+                    break
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED:
+                        raise
+                    # Nothing useful was written; start over with the next method
+                    os.ftruncate(dst_fd, 0)
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+            else:
+                method = "buffered"
+                _copy_buffered(src_fd, dst_fd, size, on_chunk)
+        elif on_chunk is not None:
+            on_chunk(size)
+        if os.fstat(dst_fd).st_size != os.fstat(src_fd).st_size:
+            raise OSError(errno.EIO, f"{source} changed while it was being copied")
+        os.fsync(dst_fd)
+    shutil.copystat(source, destination)
+    return method
+
+def move_file(source, destination, verify=VERIFY_TRANSFERS, on_chunk=None):
+    """
+    Moves a file, renaming when source and destination share a filesystem.
+    Across devices the data goes to a temporary file next to destination
+    that is optionally checked against the source's hash, renamed into
+    place and only then is the source deleted, so a failure at any point
+    leaves the source intact. Returns the number of bytes copied (0 for a
+    rename). Raises OSError.
+    """
+    try:
+        os.rename(source, destination)
+        return 0
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    st = os.lstat(source)
+    if not stat.S_ISREG(st.st_mode):
+        # Symlinks and special files are recreated rather than copied
+        shutil.move(source, destination)
+        return 0
+
+    folder, name = os.path.split(destination)
+    temp = os.path.join(folder, f".{name}.{os.getpid()}-{threading.get_ident()}.part")
+    try:
+        copy_file(source, temp, on_chunk)
+        if verify and hash_file(source, HASH_ALGORITHM) != hash_file(temp, HASH_ALGORITHM):
+            raise OSError(errno.EIO, f"checksum mismatch after copying to {destination}")
+        os.replace(temp, destination)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
+    os.remove(source)
+    return st.st_size
+
+class Transfer:
+    """
+    Moves many files at once on a thread pool with move_file, counting
+    the bytes copied across devices so throughput() can report MB/s.
+    """
+
+    def __init__(self, workers=TRANSFER_WORKERS, verify=VERIFY_TRANSFERS, progress=None, on_moved=None):
+        """on_moved(source, destination) is called from the worker as soon as a move is complete."""
+        self.verify = verify
+        self.progress = progress
+        self.on_moved = on_moved
+        self.bytes_copied = 0
+        self.files_copied = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transfer")
+
+    def _chunk(self, count):
+        BYTES_TRANSFERRED.inc(count)
+        if self.progress is not None:
+            self.progress.advance(bytes=count)
+
+    def _move(self, pair):
+        source, destination = pair
+        if self.progress is not None and self.progress.cancelled():
+            return pair, None, True
+        try:
+            copied = move_file(source, destination, self.verify, self._chunk)
+        except (OSError, shutil.Error) as e:
+            return pair, e, False
+        if self.on_moved is not None:
+            self.on_moved(source, destination)
+        if copied:
+            with self._lock:
+                self.bytes_copied += copied
+                self.files_copied += 1
+        return pair, None, False
+
+    def move_many(self, pairs):
+        """
+        Moves (source, destination) pairs and yields (pair, error, skipped)
+        in the order given; error is the exception when a move failed and
+        skipped is True for pairs left alone after a cancel.
+        """
+        start = time.perf_counter()
+        try:
+            yield from self._pool.map(self._move, pairs)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def throughput(self):
+        """MB/s copied across devices over the time spent in move_many."""
+        if not self.seconds:
+            return 0.0
+        return self.bytes_copied / (1024 * 1024) / self.seconds
+
+    def report(self):
+        """Logs and records the throughput, if anything had to be copied."""
+        if self.bytes_copied:
+            TRANSFER_THROUGHPUT.set(round(self.throughput(), 1))
+            log_action(f"Copied {self.files_copied} files ({self.bytes_copied / (1024 * 1024):.1f} MB) "
+                       f"across devices at {self.throughput():.1f} MB/s")
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
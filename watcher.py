@@ -0,0 +1,350 @@
+import ctypes
+import ctypes.util
+import heapq
+import os
+import select
+import stat
+import struct
+import threading
+import time
+from logger import log_action
+from journal import begin_operation, take_restored
+from locks import path_locks
+from metrics import track_operation
+from organizer import execute_plan
+from rules import get_ruleset
+
+# A file is organized once it has gone this long without events and its
+# size and mtime have not changed between two checks
+SETTLE_SECONDS = 2.0
+# Settled files are gathered for this long so a burst becomes one batch
+BATCH_WINDOW = 0.5
+MAX_BATCH = 1000
+# Polling fallback: how often the folder is re-listed
+POLL_INTERVAL = 2.0
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+class _Inotify:
+    """
+    Minimal inotify binding through ctypes. wait() returns the names of
+    files touched in the watched folder; None in the list means events
+    were lost and the folder must be re-listed.
+    """
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+        self.gone = False
+
+    def wait(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                names.append(None)
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self.gone = True
+            elif name and not mask & IN_ISDIR:
+                names.append(name)
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class _Poller:
+    """Fallback for systems without inotify: reports names that appeared or changed since the last listing."""
+
+    def __init__(self, path):
+        self.path = path
+        self.gone = False
+        self.seen = self._list()
+        self.next_poll = time.monotonic() + POLL_INTERVAL
+
+    def _list(self):
+        listing = {}
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            listing[entry.name] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except FileNotFoundError:
+            self.gone = True
+        return listing
+
+    def wait(self, timeout):
+        delay = self.next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0, delay))
+        self.next_poll = time.monotonic() + POLL_INTERVAL
+        listing = self._list()
+        changed = [name for name, sig in listing.items() if self.seen.get(name) != sig]
+        self.seen = listing
+        return changed
+
+    def close(self):
+        pass
+
+class _FileRef:
+    """The DirEntry subset rule sets need, for a file named by an event."""
+    __slots__ = ("name", "path", "_stat")
+
+    def __init__(self, path, name, st):
+        self.name = name
+        self.path = os.path.join(path, name)
+        self._stat = st
+
+    def stat(self):
+        return self._stat
+
+class Watcher:
+    """
+    Organizes new files in one folder as they arrive.
+
+    Each event only touches the entry for the file it names: the file's
+    settle deadline is pushed back, and once it passes the file is stat'ed
+    and either rescheduled (still changing) or queued for the next batch.
+    The folder is only listed when the watch starts or events were lost,
+    so the cost per event does not depend on how many files it holds.
+    Every batch is journaled as its own operation and can be undone.
+    """
+
+    def __init__(self, path, method="type", organize_existing=True):
+        self.path = os.path.abspath(path)
+        self.method = method
+        self.organize_existing = organize_existing
+        self.backend = None
+        self.files_organized = 0
+        self.started_at = None
+        self._pending = {}
+        self._deadlines = []
+        self._ready = []
+        self._ready_since = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        try:
+            source = _Inotify(self.path)
+            self.backend = "inotify"
+        except (OSError, AttributeError):
+            # No inotify (not Linux) or no watches left
+            source = _Poller(self.path)
+            self.backend = "polling"
+
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, args=(source,), name=f"watch-{self.path}", daemon=True)
+        self._thread.start()
+        log_action(f"👀 Watching {self.path} ({self.method}, {self.backend})")
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def to_dict(self):
+        return {
+            "path": self.path,
+            "method": self.method,
+            "backend": self.backend,
+            "running": self.running(),
+            "pending": len(self._pending),
+            "files_organized": self.files_organized,
+            "started_at": self.started_at
+        }
+
+    def _touch(self, name, now):
+        """Records activity on one file, (re)starting its settle timer."""
+        entry = self._pending.get(name)
+        deadline = now + SETTLE_SECONDS
+        if entry is None:
+            self._pending[name] = [deadline, None]
+        else:
+            entry[0] = deadline
+        heapq.heappush(self._deadlines, (deadline, name))
+
+    def _touch_all(self, now):
+        try:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False):
+                        self._touch(entry.name, now)
+        except OSError as e:
+            log_action(f"Error listing {self.path}: {e}")
+
+    def _check_due(self, now):
+        """Stats files whose settle deadline passed and moves settled ones to the ready list."""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, name = heapq.heappop(self._deadlines)
+            entry = self._pending.get(name)
+            if entry is None or entry[0] != deadline:
+                # Superseded by a later event for the same file
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name), follow_symlinks=False)
+            except OSError:
+                del self._pending[name]
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                del self._pending[name]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if entry[1] != signature:
+                # Still being written, or checked for the first time
+                entry[1] = signature
+                entry[0] = now + SETTLE_SECONDS
+                heapq.heappush(self._deadlines, (entry[0], name))
+                continue
+            del self._pending[name]
+            if not self._ready:
+                self._ready_since = now
+            self._ready.append(_FileRef(self.path, name, st))
+
+    def _flush(self):
+        """Organizes the ready files as one journaled batch."""
+        batch, self._ready = self._ready, []
+        ruleset = get_ruleset(self.method)
+        if ruleset is None:
+            log_action(f"❌ Unknown organization method: {self.method}")
+            return
+
+        # Waits for any organize, clean-up or undo running on this folder
+        with path_locks.hold([self.path], exclusive=True):
+            now = time.time()
+            moves = []
+            for ref in batch:
+                if take_restored(ref.path):
+                    # Put back by undo; organizing it again would undo the undo
+                    continue
+                folder = ruleset.destination(ref, now)
+                if folder is not None and os.path.lexists(ref.path):
+                    moves.append((ref.path, os.path.join(self.path, folder, ref.name), folder))
+            if not moves:
+                return
+
+            journal = begin_operation(self.path, self.method)
+            with track_operation("watch_organize") as run:
+                try:
+                    run.files = execute_plan(self.path, moves, journal)
+                finally:
+                    journal.close()
+        self.files_organized += run.files
+        log_action(f"✅ Watch organized {run.files} new files in {self.path}")
+
+    def _run(self, source):
+        try:
+            if self.organize_existing:
+                self._touch_all(time.monotonic())
+            while not self._stop.is_set():
+                now = time.monotonic()
+                timeout = 1.0
+                if self._deadlines:
+                    timeout = min(timeout, max(0, self._deadlines[0][0] - now))
+                if self._ready:
+                    timeout = min(timeout, max(0, self._ready_since + BATCH_WINDOW - now))
+
+                names = source.wait(timeout)
+                if source.gone:
+                    log_action(f"⚠️ Watched folder {self.path} is gone, stopping watch.")
+                    break
+
+                now = time.monotonic()
+                for name in names:
+                    if name is None:
+                        self._touch_all(now)
+                    else:
+                        self._touch(name, now)
+                self._check_due(now)
+
+                if self._ready and (len(self._ready) >= MAX_BATCH or now - self._ready_since >= BATCH_WINDOW):
+                    self._flush()
+        except Exception as e:
+            log_action(f"❌ Watch on {self.path} failed: {e}")
+        finally:
+            source.close()
+            log_action(f"Stopped watching {self.path}")
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+def start_watch(path, method="type", organize_existing=True):
+    """Starts watching path, replacing any watch already running on it."""
+    watcher = Watcher(path, method, organize_existing)
+    with _watchers_lock:
+        previous = _watchers.get(watcher.path)
+        _watchers[watcher.path] = watcher
+    # Joining the old thread can take a whole batch; other watches must not wait for it
+    if previous is not None:
+        previous.stop()
+    watcher.start()
+    return watcher
+
+def stop_watch(path):
+    """Stops the watch on path. Returns False if it was not being watched."""
+    with _watchers_lock:
+        watcher = _watchers.pop(os.path.abspath(path), None)
+    if watcher is None:
+        return False
+    watcher.stop()
+    return True
+
+def list_watches():
+    with _watchers_lock:
+        return [watcher.to_dict() for watcher in _watchers.values()]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Organize new files in a folder as they arrive.")
+    parser.add_argument("path")
+    parser.add_argument("--method", default="type", help="rule set to organize by (default: type)")
+    parser.add_argument("--new-only", action="store_true", help="leave files already in the folder alone")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.path):
+        parser.error(f"not a directory: {args.path}")
+    if get_ruleset(args.method) is None:
+        parser.error(f"unknown organization method: {args.method}")
+    watcher = start_watch(args.path, args.method, organize_existing=not args.new_only)
+    try:
+        while watcher.running():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_watch(args.path)